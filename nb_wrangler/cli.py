@@ -7,7 +7,6 @@ import argparse
 import cProfile
 import pstats
 
-from . import wrangler
 from . import utils
 from . import logger
 from . import config as config_mod
@@ -22,6 +21,7 @@ from .constants import (
     NOTEBOOK_TEST_MAX_SECS,
     NOTEBOOK_TEST_JOBS,
     NOTEBOOK_TEST_EXCLUDE,
+    REPO_CLONE_JOBS,
     VALID_ARCHIVE_FORMATS,
     NBW_OVERRIDES_MODE,
 )
@@ -474,6 +474,22 @@ def parse_args():
         const="__pycache__",
         help="Clean up specified patterns in cloned repos. Defaults to __pycache__.",
     )
+    notebook_group.add_argument(
+        "--clone-jobs",
+        default=REPO_CLONE_JOBS,
+        type=int,
+        help="Number of repos to clone or update concurrently.",
+    )
+    notebook_group.add_argument(
+        "--full-history",
+        action="store_true",
+        help="Clone repos with all file contents for every revision instead of partial (blobless) clones.",
+    )
+    notebook_group.add_argument(
+        "--clone-submodules",
+        action="store_true",
+        help="Clone and update repo submodules, fetching them in parallel.",
+    )
 
     repo_update_group = notebook_group.add_mutually_exclusive_group()
     repo_update_group.add_argument(
@@ -719,7 +735,10 @@ def _main(args) -> int:
             log.error("Failed reading URI:", args.spec_uri)
             exit_code = 1
         else:
-            notebook_wrangler = wrangler.NotebookWrangler()
+            # Deferred so --version, --spec-init, and --docker-* start quickly.
+            from .wrangler import NotebookWrangler
+
+            notebook_wrangler = NotebookWrangler()
             exit_code = notebook_wrangler.main()
             notebook_wrangler.logger.print_log_counters()
     except KeyboardInterrupt:
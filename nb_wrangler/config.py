@@ -18,6 +18,7 @@ from .constants import (
     NOTEBOOK_TEST_MAX_SECS,
     NOTEBOOK_TEST_JOBS,
     NOTEBOOK_TEST_EXCLUDE,
+    REPO_CLONE_JOBS,
     DEFAULT_LOG_TIMES_MODE,
     DEFAULT_COLOR_MODE,
     REPOS_DIR,
@@ -72,6 +73,9 @@ class WranglerConfig:
     clone_repos: bool = False
     delete_repos: bool = False
     repos_clean: Optional[list[str]] = None
+    clone_jobs: int = REPO_CLONE_JOBS
+    full_history: bool = False
+    clone_submodules: bool = False
     overwrite_local_changes: bool = False
     stash_local_changes: bool = False
     use_dirty_repos: bool = False
@@ -172,6 +176,9 @@ class WranglerConfig:
             clone_repos=args.clone_repos,
             delete_repos=args.delete_repos,
             repos_clean=args.repos_clean,
+            clone_jobs=getattr(args, "clone_jobs", REPO_CLONE_JOBS),
+            full_history=getattr(args, "full_history", False),
+            clone_submodules=getattr(args, "clone_submodules", False),
             overwrite_local_changes=args.overwrite_local_changes,
             stash_local_changes=args.stash_local_changes,
             use_dirty_repos=args.use_dirty_repos,
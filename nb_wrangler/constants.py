@@ -20,6 +20,9 @@ NBW_ROOT = Path(
 )
 NBW_PANTRY = Path(os.environ.get("NBW_PANTRY", HOME / ".nbw-pantry"))
 NBW_CACHE = Path(os.environ.get("NBW_CACHE", NBW_ROOT / "cache"))
+# Directory of persistent bare mirrors used as --reference for repo clones,
+# e.g. $NBW_CACHE/git-mirrors;  disabled when "" (the default).
+NBW_GIT_MIRRORS = os.environ.get("NBW_GIT_MIRRORS", "")
 NBW_MM = Path(
     os.environ.get("NBW_MM", os.environ.get("MAMBA_ROOT_PREFIX", NBW_ROOT / "mm"))
 )
@@ -78,6 +81,14 @@ DEFAULT_PROJECT = os.environ.get(
 NOTEBOOK_TEST_MAX_SECS = int(os.environ.get("NBW_TEST_MAX_SECS", 4 * 60 * 60))  # 60 min
 NOTEBOOK_TEST_JOBS = int(os.environ.get("NBW_TEST_JOBS", 4))
 NOTEBOOK_TEST_EXCLUDE = "$^"  # nothing?
+# Threads used to walk notebook selection directories.
+NOTEBOOK_SCAN_JOBS = int(os.environ.get("NBW_SCAN_JOBS", 8))
+
+# Repository setup constants;  clones/fetches are network bound so use threads.
+REPO_CLONE_JOBS = int(
+    os.environ.get("NBW_CLONE_JOBS", max(4, (os.cpu_count() or 4) * 3 // 4))
+)
+REPO_SUBMODULE_JOBS = int(os.environ.get("NBW_SUBMODULE_JOBS", 8))
 
 # Timeout constants (in seconds)
 DEFAULT_TIMEOUT = 300
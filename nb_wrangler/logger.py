@@ -230,9 +230,14 @@ class WranglerLogger:
         return True
 
     def debug(self, *args) -> None:
-        """Log a debug message."""
+        """Log a debug message.
+
+        Arguments are only converted and joined when DEBUG is enabled,  so hot
+        paths should pass values as separate arguments rather than f-strings.
+        """
         logger = logging.getLogger()
-        logger.debug(self._lformat(*args))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(self._lformat(*args))
         return None  # falsy,  but neither True nor False
 
     def exception(self, e: Exception, *args) -> bool:
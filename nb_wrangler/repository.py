@@ -1,27 +1,247 @@
 """Repository management for cloning and updating notebook repositories."""
 
 import os
+import shlex
 import shutil
+import stat
+import subprocess
 import sys
-import tempfile
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Any, Callable, Optional, Dict
 
 from .config import WranglerConfigurable
 from .logger import WranglerLoggable
 from .environment import WranglerEnvable
-from .constants import REPO_CLONE_TIMEOUT, DEFAULT_CLEANUP_PATTERNS
+from .constants import (
+    REPO_CLONE_TIMEOUT,
+    REPO_SUBMODULE_JOBS,
+    DEFAULT_CLEANUP_PATTERNS,
+    NBW_GIT_MIRRORS,
+)
+
+# Read-only commands fail fast rather than wait on a credentials prompt,  and skip
+# optional index locks so they do not stall on contention with IDEs, watchman, etc.
+GIT_READONLY_ENV = {"GIT_TERMINAL_PROMPT": "0", "GIT_OPTIONAL_LOCKS": "0"}
+
+# Any git command run by a _map_repos worker thread also fails fast, since one
+# clone waiting on a prompt would stall the whole pool unattended.
+GIT_POOL_ENV = {"GIT_TERMINAL_PROMPT": "0"}
+_pool_thread = threading.local()
+
+
+def _mark_pool_thread() -> None:
+    _pool_thread.active = True
+
+
+GIT_READONLY_SUBCOMMANDS = {"status", "rev-parse", "cat-file"}
+
+# Written into each clone's own .git/config:  no background auto-gc after later
+# fetches/checkouts and no filesystem monitor daemon per clone.
+GIT_CLONE_CONFIG = ("-c", "gc.auto=0", "-c", "core.fsmonitor=false")
+
+# Fetched alongside an explicit ref so origin/* tracking branches stay current.
+GIT_ORIGIN_BRANCHES_REFSPEC = "+refs/heads/*:refs/remotes/origin/*"
+
+GIT_OBJECT_TYPES = {"commit", "tag", "tree", "blob"}
+HEX_DIGITS = b"0123456789abcdefABCDEF"
+
+
+class _GitSession:
+    """A long-lived `git cat-file --batch-check` process for one repository which
+    answers revision lookups without forking git for each one.
+
+    Lookups return None whenever the session cannot answer,  e.g. git is missing,
+    the directory is not a repository, or the revision does not exist,  so callers
+    should fall back to an ordinary git subprocess.
+    """
+
+    def __init__(self, repo_root: Path, env: Optional[dict[str, str]] = None):
+        self.repo_root = repo_root
+        self.env = env
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def resolve(self, ref: str) -> Optional[str]:
+        """Return the commit SHA `ref` points to,  peeling annotated tags."""
+        found = self._query(ref + "^{commit}")
+        return found[0] if found else None
+
+    def type_of(self, sha: str) -> Optional[str]:
+        found = self._query(sha)
+        return found[1] if found else None
+
+    def _query(self, revision: str) -> Optional[tuple[str, str]]:
+        if not revision or any(c.isspace() for c in revision):
+            return None
+        with self._lock:
+            try:
+                process = self._start()
+                process.stdin.write(revision + "\n")  # type: ignore[union-attr]
+                process.stdin.flush()  # type: ignore[union-attr]
+                line = process.stdout.readline()  # type: ignore[union-attr]
+            except OSError:
+                line = ""
+            if not line:
+                self._stop()
+        words = line.split()
+        if len(words) != 2 or words[1] not in GIT_OBJECT_TYPES:
+            return None
+        return words[0], words[1]
+
+    def _start(self) -> subprocess.Popen:
+        if self._process is None:
+            self._process = subprocess.Popen(
+                ["git", "cat-file", "--batch-check=%(objectname) %(objecttype)"],
+                cwd=str(self.repo_root),
+                env=self.env,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+            )
+        return self._process
+
+    def _stop(self) -> None:
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()  # type: ignore[union-attr]
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+        process.stdout.close()  # type: ignore[union-attr]
+
+    def close(self) -> None:
+        with self._lock:
+            self._stop()
 
 
 class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable):
     """Manages git repository operations for notebook collections."""
 
+    # Serializes interactive dirty-repo prompts when repos are prepared concurrently.
+    _prompt_lock = threading.Lock()
+
+    # Mirrors are refreshed at most once per process, one thread per mirror.
+    _mirror_locks: dict[str, threading.Lock] = {}
+    _mirror_locks_guard = threading.Lock()
+    _mirrors_refreshed: set[str] = set()
+
     def __init__(self, repos_dir: Path):
         super().__init__()
         self.repos_dir = repos_dir
+        self.mirrors_dir = Path(NBW_GIT_MIRRORS) if NBW_GIT_MIRRORS else None
+        # Read-only git results keyed by resolved repo path;  see _invalidate().
+        self._status_cache: dict[Path, tuple[bool, Optional[str]]] = {}
+        self._ref_cache: dict[Path, dict[str, str]] = {}
+        self._sessions: dict[Path, _GitSession] = {}
+        self._repo_names: dict[str, str] = {}
+        self._tags_fetched: set[Path] = set()
+
+    def __del__(self):
+        self.close_sessions()
 
     def run(self, *args, **keys):
-        return self.env_manager.wrangler_run(*args, **keys)
+        command = args[0] if args else keys.get("command", "")
+        if "env" not in keys and (env := self._git_env(command)) is not None:
+            keys["env"] = env
+        try:
+            return self.env_manager.wrangler_run(*args, **keys)
+        finally:
+            if keys.get("cwd") and not self._is_readonly_git(command):
+                self._invalidate(keys["cwd"])
+
+    @staticmethod
+    def _git_words(command: list[str] | tuple[str] | str) -> list[str]:
+        return shlex.split(command) if isinstance(command, str) else list(command)
+
+    @classmethod
+    def _is_readonly_git(cls, command: list[str] | tuple[str] | str) -> bool:
+        """Return True IFF `command` is a git command which cannot modify a repo."""
+        words = cls._git_words(command)
+        if not words or words[0] != "git":
+            return False
+        subcommand = words[1] if len(words) > 1 else ""
+        return (
+            subcommand in GIT_READONLY_SUBCOMMANDS
+            or (subcommand == "fetch" and "--dry-run" in words)
+            or (subcommand == "tag" and ("-l" in words or "--list" in words))
+        )
+
+    @classmethod
+    def _git_env(
+        cls, command: list[str] | tuple[str] | str
+    ) -> Optional[dict[str, str]]:
+        """Return the subprocess environment for a read-only git `command`, or for
+        any git command run in the _map_repos thread pool.  Otherwise return None so
+        the command simply inherits os.environ,  e.g. so an interactive push can
+        still prompt for credentials.  Settings already present in os.environ take
+        precedence over the defaults.
+        """
+        if cls._is_readonly_git(command):
+            return {**GIT_READONLY_ENV, **os.environ}
+        in_pool = getattr(_pool_thread, "active", False)
+        if in_pool and cls._git_words(command)[:1] == ["git"]:
+            return {**GIT_POOL_ENV, **os.environ}
+        return None
+
+    @staticmethod
+    def _cache_key(repo_path: str | Path) -> Path:
+        return Path(repo_path).resolve()
+
+    def _invalidate(self, repo_path: str | Path) -> None:
+        """Forget cached git state for `repo_path` after it may have changed.
+
+        run() calls this automatically for any non-read-only command executed with
+        cwd=repo_path;  direct filesystem changes must call it explicitly.
+        """
+        key = self._cache_key(repo_path)
+        self._status_cache.pop(key, None)
+        self._ref_cache.pop(key, None)
+        self._close_session(key)
+
+    def _session(self, repo_root: str | Path) -> _GitSession:
+        """Return the persistent git lookup session for `repo_root`."""
+        key = self._cache_key(repo_root)
+        if key not in self._sessions:
+            env = self._git_env(("git", "cat-file"))
+            self._sessions[key] = _GitSession(key, env)
+        return self._sessions[key]
+
+    def _close_session(self, repo_root: str | Path) -> None:
+        """Shut down the git lookup process for `repo_root`, if any.
+
+        Bulk operations call this as each repo finishes so preparing hundreds of
+        repos keeps at most config.clone_jobs lookup processes alive.
+        """
+        if (
+            session := self._sessions.pop(self._cache_key(repo_root), None)
+        ) is not None:
+            session.close()
+
+    def close_sessions(self) -> None:
+        """Shut down any persistent git lookup processes."""
+        for key in list(getattr(self, "_sessions", {})):
+            if (session := self._sessions.pop(key, None)) is not None:
+                session.close()
+
+    def _rev_parse(self, repo_root: str | Path, ref: str) -> Optional[str]:
+        """Resolve `ref` to a commit SHA via the repo's git session,  falling back
+        to a one-off `git rev-parse` subprocess.
+        """
+        if (sha := self._session(repo_root).resolve(ref)) is not None:
+            return sha
+        result = self.run(
+            ("git", "rev-parse", "--verify", f"{ref}^{{commit}}"),
+            check=False,
+            cwd=repo_root,
+        )
+        return result.stdout.strip() if result.returncode == 0 else None
 
     def handle_result(self, *args, **keys):
         return self.env_manager.handle_result(*args, **keys)
@@ -33,27 +253,66 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         repo_refs: Optional[dict[str, str | None]] = None,
     ) -> dict[str, str]:
         """set up all specified repositories."""
-        self.logger.debug(f"Setting up repos. urls={repo_urls}.")
-        repo_states = {}
-        for repo_url in repo_urls:
+        self.logger.debug("Setting up repos. urls:", repo_urls)
+
+        def setup_one(repo_url: str) -> str:
             ref = repo_refs.get(repo_url) if repo_refs else None
-            repo_path = self._setup_remote_repo(
-                repo_url,
-                floating_mode=floating_mode,
-                ref=ref,
-            )
-            if not repo_path:
-                raise RuntimeError(f"Failed to setup repository {repo_url}")
-            current_hash = self.get_hash(repo_path)
-            if not current_hash:
-                raise RuntimeError(f"Failed to get hash for repository {repo_url}")
-            repo_states[repo_url] = current_hash
-        return repo_states
+            try:
+                repo_path = self._setup_remote_repo(
+                    repo_url,
+                    floating_mode=floating_mode,
+                    ref=ref,
+                )
+                if not repo_path:
+                    raise RuntimeError(f"Failed to setup repository {repo_url}")
+                current_hash = self.get_hash(repo_path)
+                if not current_hash:
+                    raise RuntimeError(f"Failed to get hash for repository {repo_url}")
+                return current_hash
+            finally:
+                self._close_session(self._repo_path(repo_url))
+
+        hashes = self._map_repos(setup_one, repo_urls, key=self._repo_path)
+        return dict(zip(repo_urls, hashes))
+
+    def _map_repos(
+        self,
+        func: Callable[[Any], Any],
+        items: list,
+        key: Optional[Callable[[Any], Any]] = None,
+    ) -> list:
+        """Apply `func` to each of `items` using up to config.clone_jobs threads.
+
+        Git clones and fetches spend their time waiting on the network so they
+        overlap well.  Items with equal `key`,  e.g. URLs which clone into the same
+        directory,  are handled one after another in their original order rather
+        than concurrently.  Results are returned in the order of `items` and the
+        first exception raised by `func` is re-raised here.
+        """
+        groups: dict[Any, list[int]] = {}
+        for i, item in enumerate(items):
+            groups.setdefault(key(item) if key else i, []).append(i)
+        jobs = max(1, min(len(groups), self.config.clone_jobs))
+        if jobs == 1:
+            return [func(item) for item in items]
+        results: list = [None] * len(items)
+
+        def run_group(indices: list[int]) -> None:
+            for i in indices:
+                results[i] = func(items[i])
+
+        with ThreadPoolExecutor(
+            max_workers=jobs, initializer=_mark_pool_thread
+        ) as executor:
+            list(executor.map(run_group, groups.values()))
+        return results
 
     def _repo_path(self, repo_url: str) -> Path:
         """Get the path for a repository."""
-        repo_name = repo_url.split("/")[-1].replace(".git", "")
-        repo_name = repo_name.split("@")[0]
+        repo_name = self._repo_names.get(repo_url)
+        if repo_name is None:
+            repo_name = repo_url.split("/")[-1].replace(".git", "")
+            repo_name = self._repo_names[repo_url] = repo_name.split("@")[0]
         return self.repos_dir / repo_name
 
     get_repo_path = _repo_path
@@ -79,10 +338,6 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
             return self.logger.exception(e, f"Failed to setup repository {repo_url}.")
         return repo_path
 
-    def _get_default_branch(self, repo_path: Path) -> Optional[str]:
-        """Resolve the default branch name from origin/HEAD."""
-        return self.git_head_ref(repo_path)
-
     def _resolve_ref_with_fallback(
         self, repo_name: str, ref_to_checkout: str, ref: Optional[str]
     ) -> bool:
@@ -104,35 +359,35 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
     ) -> Optional[Path]:
         """Update an existing repository in floating mode.
 
-        Fetches tags, resolves the default branch (or uses the given ref),
-        checks out via direct attempt then tag-prefix fallback, and pulls for
-        updates when a specific ref was requested. Returns None on failure so
+        Fetches the given ref (or origin's HEAD) together with tags and origin's
+        branches, then checks out FETCH_HEAD, so no default branch lookup is
+        needed.  When *ref* is a local branch it is fast-forwarded to FETCH_HEAD
+        instead,  since later resolution of *ref* finds the local branch first.
+        Refs origin cannot serve directly, e.g. tag prefixes, fall back to
+        direct checkout then tag-prefix resolution.  Returns None on failure so
         callers propagate the original error semantics.
         """
-        self.logger.debug(f"Floating mode: updating repo {repo_url}")
+        self.logger.debug("Floating mode: updating repo", repo_url)
         checkout_success = False
+        ref_to_checkout = ref or "HEAD"
         try:
-            self.git_fetch_tags(repo_path)
-            default_branch = self._get_default_branch(repo_path)
-            if default_branch is None:
-                return self.logger.error(  # returns None
-                    f"Failed to determine default branch for {repo_url}."
+            if self.git_fetch_ref(repo_path, ref_to_checkout):
+                if ref and self._session(repo_path).resolve(f"refs/heads/{ref}"):
+                    self.git_fast_forward_branch(repo_path, ref)
+                else:
+                    self.git_checkout_required(repo_path, "FETCH_HEAD")
+                checkout_success = True
+            elif ref:
+                checkout_success = self._resolve_ref_with_fallback(
+                    repo_path.name, ref, ref
                 )
-            ref_to_checkout = ref or f"origin/{default_branch}"
-
-            checkout_success = self._resolve_ref_with_fallback(
-                repo_path.name, ref_to_checkout, ref
-            )
-
-            if checkout_success and ref:
-                self.git_pull(repo_path)
-            elif not checkout_success:
+            if not checkout_success:
                 raise ValueError(
                     f"Could not find ref '{ref_to_checkout}' in {repo_url}."
                 )
         except Exception as e:
             return self.logger.exception(e, f"Failed to update repository {repo_url}.")
-        return repo_path if checkout_success else None
+        return repo_path
 
     def _update_locked(
         self, repo_path: Path, repo_url: str, ref: Optional[str]
@@ -163,7 +418,7 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         repo_path = self._repo_path(repo_url)
         if not repo_path.exists():
             return self._clone_repo(repo_url, repo_path, floating_mode, ref)
-        self.logger.debug(f"Using existing local clone at {repo_path}")
+        self.logger.debug("Using existing local clone at", repo_path)
         try:
             result = (
                 self._update_floating(repo_path, repo_url, ref)
@@ -180,17 +435,36 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         repo_dir: Path,
         ref: Optional[str] = None,
     ) -> bool:
-        """Clone a new repository."""
+        """Clone a new repository.
+
+        Unless config.full_history is set,  clones are partial (blobless):  all
+        commits, trees, and refs are fetched so any branch, tag prefix, or SHA can
+        still be resolved and checked out,  but file contents are only downloaded
+        for the revisions actually checked out.
+        """
         # Clone the main branch first
-        clone_args = ""
+        clone_args = list(GIT_CLONE_CONFIG)
+        if not self.config.full_history:
+            clone_args.append("--filter=blob:none")
+        if self.config.clone_submodules:
+            clone_args += [
+                "--recurse-submodules",
+                "--shallow-submodules",
+                "--jobs",
+                str(REPO_SUBMODULE_JOBS),
+            ]
+        if (mirror := self._ensure_mirror(repo_url)) is not None:
+            clone_args += ["--reference-if-able", str(mirror), "--dissociate"]
         self.logger.info(f"Cloning repository {repo_url} to {repo_dir}.")
         if self.env_manager is None:
             raise RuntimeError("Environment manager not available")
         self.run(
-            f"git clone {clone_args} {repo_url} {str(repo_dir)}",
+            ("git", "clone", *clone_args, "--", repo_url, str(repo_dir)),
             check=True,
             timeout=REPO_CLONE_TIMEOUT,
         )
+        self._invalidate(repo_dir)
+        self._tags_fetched.add(self._cache_key(repo_dir))  # clones carry all tags
         # Check out the specific ref if provided
         if ref:
             self.logger.info(f"Checking out reference {ref}.")
@@ -198,50 +472,160 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
             return self.git_checkout(repo_name, ref)
         return True
 
+    def _mirror_path(self, repo_url: str) -> Optional[Path]:
+        """Return the bare mirror location for `repo_url`, or None when mirrors are
+        disabled or `repo_url` is already a local path.
+        """
+        if self.mirrors_dir is None or os.path.exists(repo_url):
+            return None
+        parsed = urllib.parse.urlparse(repo_url)
+        if parsed.scheme == "file":
+            return None
+        if parsed.hostname:
+            host, path = parsed.hostname, parsed.path
+        else:  # scp-like syntax,  e.g. git@github.com:org/repo.git
+            host, _, path = repo_url.split("@")[-1].partition(":")
+        name = path.strip("/").removesuffix(".git")
+        return self.mirrors_dir / host / f"{name}.git"
+
+    def _ensure_mirror(self, repo_url: str) -> Optional[Path]:
+        """Create or update the bare mirror of `repo_url`, returning its path if it
+        is usable as a clone reference.
+        """
+        mirror = self._mirror_path(repo_url)
+        if mirror is None:
+            return None
+        with self._mirror_locks_guard:
+            lock = self._mirror_locks.setdefault(str(mirror), threading.Lock())
+        with lock:
+            if str(mirror) not in self._mirrors_refreshed:
+                try:
+                    self._refresh_mirror(repo_url, mirror)
+                except Exception as e:
+                    self.logger.warning(f"Skipping git mirror {mirror}: {e}")
+                self._mirrors_refreshed.add(str(mirror))
+        return mirror if mirror.exists() else None
+
+    def _refresh_mirror(self, repo_url: str, mirror: Path) -> bool:
+        if mirror.exists():
+            self.logger.debug("Updating git mirror", mirror)
+            command = ("git", "-C", str(mirror), "remote", "update", "--prune")
+        else:
+            self.logger.info(f"Creating git mirror of {repo_url} at {mirror}.")
+            mirror.parent.mkdir(parents=True, exist_ok=True)
+            # Match the clones:  a full mirror would be copied whole into each
+            # --dissociate'd partial clone.
+            filter_args = () if self.config.full_history else ("--filter=blob:none",)
+            command = (
+                "git",
+                "clone",
+                "--mirror",
+                *filter_args,
+                "--",
+                repo_url,
+                str(mirror),
+            )
+        result = self.run(command, check=False, timeout=REPO_CLONE_TIMEOUT)
+        return self.handle_result(
+            result,
+            f"Failed refreshing git mirror {mirror}; cloning without it:",
+            error_func=self.logger.warning,
+        )
+
     def get_hash(self, repo_path: str | Path) -> Optional[str]:
         """Get the current commit hash of a repository."""
-        if not self.is_clean(repo_path):
+        clean, head_sha = self.inspect_repo(repo_path)
+        if not clean:
             self.logger.warning(
                 f"Repo '{repo_path}' is dirty, hash may not be accurate."
             )
-        result = self.run("git rev-parse HEAD", check=False, cwd=repo_path)
-        if result.returncode == 0:
-            return result.stdout.strip()
-        self.logger.error(f"Failed to get git hash for repo {repo_path}")
-        return None
+        if head_sha is None:
+            self.logger.error(f"Failed to get git hash for repo {repo_path}")
+        return head_sha
 
     def delete_repos(self, urls: list[str]) -> bool:
         """Clean up cloned repositories."""
+
+        def delete_one(url: str) -> None:
+            path = self._repo_path(url)
+            self._invalidate(path)
+            if path.exists():
+                self.logger.debug("Removing repo directory:", str(path))
+                self._remove_tree(path)
+            else:
+                self.logger.debug("Skipping delete for nonexistent:", str(path))
+
         try:
-            for url in urls:
-                path = self._repo_path(url)
-                if path.exists():
-                    self.logger.debug("Removing repo directory:", str(path))
-                    shutil.rmtree(path)
-                else:
-                    self.logger.debug("Skipping delete for nonexistent:", str(path))
-            remaining_contents = [str(obj) for obj in self.repos_dir.glob("*")]
-            if not remaining_contents:
+            # Working trees are many small files, so unlinks overlap well.
+            self._map_repos(delete_one, list(urls), key=self._repo_path)
+            with os.scandir(self.repos_dir) as entries:
+                first = next(entries, None)
+                if first is not None:
+                    self.logger.debug(
+                        "Skipping removal of non-empty repos directory:",
+                        str(self.repos_dir),
+                        "due remaining contents:",
+                        first.path,
+                        "...",
+                    )
+            if first is None:
                 self.logger.debug(
                     "Removing empty repos directory:", str(self.repos_dir)
                 )
                 self.repos_dir.rmdir()
-            else:
-                self.logger.debug(
-                    "Skipping removal of non-empty repos directory:",
-                    str(self.repos_dir),
-                    "due remaining contents:",
-                    remaining_contents,
-                )
             return True
         except Exception as e:
             return self.logger.exception(e, "Error during repository deletion:")
 
+    @staticmethod
+    def _remove_tree(path: str | Path) -> None:
+        """Recursively delete `path`, making entries writable and retrying when
+        removal is refused,  e.g. for the read-only object files git creates.
+        """
+
+        def make_writable_and_retry(func, failed_path, _exc):
+            # Unlinking depends only on the parent's permissions;  a directory
+            # must also be writable itself to be emptied.  Never chmod through
+            # a symlink,  which could point outside the tree.
+            parent = os.path.dirname(failed_path)
+            os.chmod(parent, os.stat(parent).st_mode | stat.S_IRWXU)
+            if os.path.isdir(failed_path) and not os.path.islink(failed_path):
+                os.chmod(failed_path, os.stat(failed_path).st_mode | stat.S_IRWXU)
+            func(failed_path)
+
+        if sys.version_info >= (3, 12):
+            shutil.rmtree(path, onexc=make_writable_and_retry)
+        else:
+            shutil.rmtree(path, onerror=make_writable_and_retry)
+
     def is_clean(self, repo_root: str | Path) -> bool:
-        stats: str = self.run("git status --porcelain", check=True, cwd=repo_root)
-        stats = "clean" if stats == "" else "dirty"
-        self.logger.debug(f"Repo '{repo_root}' status is: {stats}.")
-        return stats == "clean"
+        return self.inspect_repo(repo_root)[0]
+
+    def inspect_repo(self, repo_root: str | Path) -> tuple[bool, Optional[str]]:
+        """Return (is_clean, head_sha) for `repo_root` using one `git status` call.
+
+        head_sha is None for a repo with no commits yet.  Results are cached until
+        the repo is next modified,  see _invalidate().
+        """
+        key = self._cache_key(repo_root)
+        if key not in self._status_cache:
+            output: str = self.run(
+                ("git", "status", "--porcelain=v2", "--branch"),
+                check=True,
+                cwd=repo_root,
+            )
+            clean, head_sha = True, None
+            for line in output.splitlines():
+                if line.startswith("# branch.oid "):
+                    oid = line.split()[-1]
+                    head_sha = None if oid == "(initial)" else oid
+                elif line.strip() and not line.startswith("#"):
+                    clean = False
+            self.logger.debug(
+                "Repo", repo_root, "status is:", "clean" if clean else "dirty"
+            )
+            self._status_cache[key] = (clean, head_sha)
+        return self._status_cache[key]
 
     def branch_repo(
         self, repo_name: str, new_branch: str, ingest_branch: str = "origin/main"
@@ -252,20 +636,18 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         if not self.is_clean(repo_root):
             return self.logger.error(f"Won't branch dirty repo {repo_name}.")
         self.logger.debug(
-            f"Branching {repo_name} from {ingest_branch} to {new_branch}."
+            "Branching", repo_name, "from", ingest_branch, "to", new_branch
         )
         if not self.git_checkout(repo_name, ingest_branch):
             return False
-        if not self.git_create_branch(repo_name, new_branch):
-            return False
-        return True
+        return self.git_create_branch(repo_name, new_branch)
 
     def git_checkout(self, repo_name: str, branch: str) -> bool:
         repo_root = self.repos_dir / repo_name
-        result = self.run(f"git checkout {branch}", check=False, cwd=repo_root)
+        result = self.run(("git", "checkout", branch), check=False, cwd=repo_root)
         if result.returncode == 0:
-            self.logger.debug(f"Checked out repo {repo_name} existing branch {branch}.")
-            return True
+            self.logger.debug("Checked out repo", repo_name, "existing branch", branch)
+            return self.git_update_submodules(repo_root)
         else:
             self.logger.warning(
                 f"Failed checking out repo {repo_name} existing branch {branch}."
@@ -273,14 +655,16 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
             self.logger.warning(
                 "This is normal for abstract tags that do not exist but patch tags do exist."
             )
-            self.logger.debug(f"returncode was: {result.returncode}")
-            self.logger.debug(f"stdout was: {result.stdout}")
-            self.logger.debug(f"stderr was: {result.stderr}")
+            self.logger.debug("returncode was:", result.returncode)
+            self.logger.debug("stdout was:", result.stdout)
+            self.logger.debug("stderr was:", result.stderr)
             return False
 
     def git_create_branch(self, repo_name, new_branch):
         repo_root = self.repos_dir / repo_name
-        result = self.run(f"git checkout -b {new_branch}", check=False, cwd=repo_root)
+        result = self.run(
+            ("git", "checkout", "-b", new_branch), check=False, cwd=repo_root
+        )
         return self.handle_result(
             result,
             f"Failed creating new branch {new_branch} of repo {repo_name}: ",
@@ -290,7 +674,7 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
     def git_add(self, repo_name: str, path_to_add: str | Path) -> bool:
         path_to_add = str(path_to_add)
         repo_root = self.repos_dir / repo_name
-        result = self.run(f"git add {path_to_add}", check=False, cwd=repo_root)
+        result = self.run(("git", "add", "--", path_to_add), check=False, cwd=repo_root)
         return self.handle_result(
             result,
             f"Failed adding {path_to_add} from {repo_name}: ",
@@ -299,15 +683,14 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
 
     def git_commit(self, repo_name: str, commit_msg: str) -> bool:
         repo_root = self.repos_dir / repo_name
-        with tempfile.NamedTemporaryFile(mode="w+") as temp:
-            temp.write(commit_msg)
-            temp.flush()
-            result = self.run(f"git commit -F {temp.name}", check=False, cwd=repo_root)
-            return self.handle_result(
-                result,
-                f"Failed commiting {repo_name}: ",
-                f"Commited {repo_name}.",
-            )
+        result = self.run(
+            ("git", "commit", "-F", "-"), check=False, cwd=repo_root, input=commit_msg
+        )
+        return self.handle_result(
+            result,
+            f"Failed commiting {repo_name}: ",
+            f"Commited {repo_name}.",
+        )
 
     def git_push(self, repo_name: str, branch_name: str) -> bool:
         repo_root = self.repos_dir / repo_name
@@ -315,7 +698,9 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
             return self.logger.error(
                 f"As a safety measure, refusing to push to main branch of {repo_name}."
             )
-        result = self.run(f"git push origin {branch_name}", check=False, cwd=repo_root)
+        result = self.run(
+            ("git", "push", "origin", branch_name), check=False, cwd=repo_root
+        )
         return self.handle_result(
             result,
             f"Failed pushing repo {repo_name} branch {branch_name}: ",
@@ -325,7 +710,9 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
     def git_remote_add(self, remote_name: str, remote_url: str) -> bool:
         repo_path = self._repo_path(remote_url)
         result = self.run(
-            f"git remote add {remote_name} {remote_url}", check=False, cwd=repo_path
+            ("git", "remote", "add", remote_name, remote_url),
+            check=False,
+            cwd=repo_path,
         )
         return self.handle_result(
             result,
@@ -340,90 +727,129 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         Unlike ``git_checkout``, this raises on failure (``check=True``).
         Used by callers that require the checkout to succeed unconditionally.
         """
-        self.run(f"git checkout {ref}", check=True, cwd=repo_path)
-
-    def git_fetch_tags(self, repo_path: Path, check: bool = True) -> None:
-        """Fetch all tags from the remote of a repository."""
-        self.run("git fetch --tags", check=check, cwd=repo_path)
+        self.run(("git", "checkout", ref), check=True, cwd=repo_path)
+        if not self.git_update_submodules(repo_path):
+            raise RuntimeError(f"Failed updating submodules of {repo_path}.")
 
-    def git_pull(self, repo_path: Path) -> None:
-        """Pull updates from the tracked upstream branch."""
-        self.run("git pull", check=True, cwd=repo_path)
+    def git_fast_forward_branch(self, repo_path: Path, branch: str) -> None:
+        """Check out local *branch* and fast-forward it to FETCH_HEAD,  raising
+        if it has diverged from what was fetched.
+        """
+        self.run(("git", "checkout", branch), check=True, cwd=repo_path)
+        self.run(("git", "merge", "--ff-only", "FETCH_HEAD"), check=True, cwd=repo_path)
+        if not self.git_update_submodules(repo_path):
+            raise RuntimeError(f"Failed updating submodules of {repo_path}.")
+
+    def git_update_submodules(self, repo_path: Path) -> bool:
+        """When config.clone_submodules is set,  bring submodules in line with
+        the current checkout,  fetching up to REPO_SUBMODULE_JOBS in parallel.
+        """
+        if not self.config.clone_submodules:
+            return True
+        result = self.run(
+            (
+                "git",
+                "submodule",
+                "update",
+                "--init",
+                "--recursive",
+                "--jobs",
+                str(REPO_SUBMODULE_JOBS),
+            ),
+            check=False,
+            cwd=repo_path,
+            timeout=REPO_CLONE_TIMEOUT,
+        )
+        return self.handle_result(
+            result,
+            f"Failed updating submodules of {repo_path}: ",
+            f"Updated submodules of {repo_path}.",
+        )
 
-    def git_head_ref(self, repo_path: Path) -> Optional[str]:
-        """Resolve ``refs/remotes/origin/HEAD`` to a default branch name.
+    def git_fetch_tags(self, repo_path: Path, check: bool = True) -> None:
+        """Fetch all tags from the remote of a repository.
 
-        Returns ``None`` when symbolic-ref cannot find the value (e.g.,
-        on repositories that have never been pushed).
+        Tags are fetched at most once per repository for the life of this
+        manager,  so ref resolution does not go back to the network each time.
+        """
+        key = self._cache_key(repo_path)
+        if key in self._tags_fetched:
+            return
+        result = self.run(("git", "fetch", "--tags"), check=check, cwd=repo_path)
+        if check or result.returncode == 0:
+            self._tags_fetched.add(key)
+
+    def git_fetch_ref(self, repo_path: Path, ref: str = "HEAD") -> bool:
+        """Fetch *ref*, all tags, and origin's branches,  leaving *ref* first in
+        FETCH_HEAD and the origin/* tracking branches current.
+
+        Returns False when origin does not advertise *ref*,  e.g. a tag prefix.
         """
         result = self.run(
-            "git symbolic-ref refs/remotes/origin/HEAD",
+            ("git", "fetch", "--tags", "origin", ref, GIT_ORIGIN_BRANCHES_REFSPEC),
             check=False,
-            capture_output=True,
             cwd=repo_path,
         )
         if result.returncode != 0:
-            return None
-        return (
-            result.stdout.strip().replace("refs/remotes/origin/", "").replace("\n", "")
-        )
+            self.logger.debug(
+                "Could not fetch", repr(ref), "for", repo_path, result.stderr
+            )
+            return False
+        self._tags_fetched.add(self._cache_key(repo_path))
+        return True
 
     def github_create_pr(
         self, repo_name: str, merge_to: str, title: str, body_msg: str
     ) -> bool:
         repo_root = self.repos_dir / repo_name
-        with tempfile.NamedTemporaryFile(mode="w+") as temp:
-            temp.write(body_msg)
-            temp.flush()
-            result = self.run(
-                (
-                    "gh",
-                    "pr",
-                    "create",
-                    # "--base",
-                    # merge_to,
-                    "--no-maintainer-edit",
-                    "--title",
-                    "'" + title + "'",
-                    "--body-file",
-                    temp.name,
-                ),
-                check=False,
-                cwd=repo_root,
-            )
-            return self.handle_result(
-                result,
-                f"Failed creating PR {title} for {repo_name}: ",
-                f"Created PR {title} to {merge_to} for {repo_name}.",
-            )
+        result = self.run(
+            (
+                "gh",
+                "pr",
+                "create",
+                # "--base",
+                # merge_to,
+                "--no-maintainer-edit",
+                "--title",
+                title,
+                "--body-file",
+                "-",
+            ),
+            check=False,
+            cwd=repo_root,
+            input=body_msg,
+        )
+        return self.handle_result(
+            result,
+            f"Failed creating PR {title} for {repo_name}: ",
+            f"Created PR {title} to {merge_to} for {repo_name}.",
+        )
 
     def github_merge_pr(
         self, repo_name: str, merge_from: str, title: str, body_msg: str
     ) -> bool:
         repo_root = self.repos_dir / repo_name
-        with tempfile.NamedTemporaryFile(mode="w+") as temp:
-            temp.write(body_msg)
-            temp.flush()
-            result = self.run(
-                (
-                    "gh",
-                    "pr",
-                    "merge",
-                    merge_from,
-                    "--rebase",
-                    "-t",
-                    "'" + title + "'",
-                    "--body-file",
-                    temp.name,
-                ),
-                check=False,
-                cwd=repo_root,
-            )
-            return self.handle_result(
-                result,
-                f"Failed merging PR {title} to {repo_name}: ",
-                f"Merged PR {title} to {repo_name}.",
-            )
+        result = self.run(
+            (
+                "gh",
+                "pr",
+                "merge",
+                merge_from,
+                "--rebase",
+                "-t",
+                title,
+                "--body-file",
+                "-",
+            ),
+            check=False,
+            cwd=repo_root,
+            input=body_msg,
+        )
+        return self.handle_result(
+            result,
+            f"Failed merging PR {title} to {repo_name}: ",
+            f"Merged PR {title} to {repo_name}.",
+        )
 
     def _clone_and_checkout(
         self, repo_url: str, repo_path: Path, desired_ref: str
@@ -476,16 +902,20 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         if self.config.use_dirty_repos:
             return self.logger.info(f"Using dirty repository {repo_name} as-is.")
 
+        with self._prompt_lock:
+            return self._prompt_dirty_repository(repo_name)
+
+    def _prompt_dirty_repository(self, repo_name: str) -> bool:
+        """Ask the user how to handle a dirty repository, defaulting to stash."""
+        if not sys.stdin.isatty():
+            self.logger.warning(
+                f"No interactive terminal; stashing local changes in {repo_name}."
+            )
+            return self.git_stash(repo_name)
+        prompt = f"Repo '{repo_name}' is dirty. [S]tash changes, [D]iscard changes, [I]gnore (use as-is), or [A]bort? (S/D/I/A): "
         while True:
             try:
-                if sys.stdin.isatty():
-                    prompt = f"Repo '{repo_name}' is dirty. [S]tash changes, [D]iscard changes, [I]gnore (use as-is), or [A]bort? (S/D/I/A): "
-                    choice = input(prompt).upper()
-                else:
-                    self.logger.warning(
-                        f"No interactive terminal; stashing local changes in {repo_name}."
-                    )
-                    return self.git_stash(repo_name)
+                choice = input(prompt).strip().upper()
             except EOFError:
                 self.logger.warning(
                     f"EOF reading stdin; stashing local changes in {repo_name}."
@@ -500,11 +930,6 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
             elif choice == "I":
                 return self.logger.info(f"Using dirty repository {repo_name} as-is.")
 
-    @staticmethod
-    def _derive_repo_name(repo_url: str) -> str:
-        """Extract the repository name from a URL or path string."""
-        return repo_url.split("/")[-1].replace(".git", "")
-
     def _clone_if_missing(self, repo_url: str, desired_ref: str) -> bool:
         """Fresh-clone a not-yet-existing repository and check out the requested ref."""
         repo_path = self._repo_path(repo_url)
@@ -521,7 +946,7 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
                 f"Backup directory {backup_dir} already exists; removing it before new backup."
             )
             try:
-                shutil.rmtree(backup_dir)
+                self._remove_tree(backup_dir)
             except Exception as e:
                 return self.logger.error(
                     f"Failed to remove existing backup {backup_dir}: {e}"
@@ -530,6 +955,7 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         # Move the current repo into the backup location, then reclone fresh.
         try:
             shutil.move(str(repo_path), backup_dir, copy_function=shutil.copytree)
+            self._invalidate(repo_path)
         except Exception as e:
             return self.logger.error(
                 f"Failed to backup existing repository {repo_name}: {e}"
@@ -558,7 +984,8 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         )
         # Remove the broken directory before recloning.
         try:
-            shutil.rmtree(repo_path)
+            self._remove_tree(repo_path)
+            self._invalidate(repo_path)
         except Exception as e:
             return self.logger.error(
                 f"Failed to delete corrupted repository {repo_name}: {e}"
@@ -616,19 +1043,16 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
     def _current_sha_safe(self, repo_path: Path) -> Optional[str]:
         """Return HEAD SHA without failing on detached-unborn trees."""
         try:
-            result = self.run("git rev-parse HEAD", check=False, cwd=repo_path)
-            if result.returncode == 0:
-                return result.stdout.strip()
+            return self.inspect_repo(repo_path)[1]
         except Exception as e:
-            self.logger.debug(f"Unable to read current SHA at {repo_path}: {e}")
+            self.logger.debug("Unable to read current SHA at", repo_path, e)
         return None
 
     def prepare_repository(self, repo_url: str, desired_ref: str) -> bool:
         """Ensure a repository is cloned and at the correct, clean ref."""
         self.logger.info(f"Preparing repository {repo_url} at ref {desired_ref}")
-        repo_name = self._derive_repo_name(repo_url)
-
         repo_path = self._repo_path(repo_url)
+        repo_name = repo_path.name
         if not repo_path.exists():
             return self._clone_if_missing(repo_url, desired_ref)
 
@@ -638,14 +1062,26 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
             if not recovered:
                 return False
 
+        current_sha_safe = self._current_sha_safe(repo_path)
+
+        # A pinned commit SHA already checked out needs no fetch or ref resolution.
+        if (
+            self._is_commit_hash(desired_ref)
+            and current_sha_safe == desired_ref.lower()
+            and self.is_clean(repo_path)
+        ):
+            self.logger.info(
+                f"Repository {repo_name} already cloned and at pinned commit "
+                f"{desired_ref[:7]}; reusing existing checkout."
+            )
+            return True
+
         # Idempotency check: resolve desired ref to SHA and compare to current HEAD.
         target_sha = None
         try:
             target_sha = self.resolve_ref_to_sha(repo_name, desired_ref)
         except Exception as e:
-            self.logger.debug(f"Ref resolution lookup failed for {repo_url}: {e}")
-
-        current_sha_safe = self._current_sha_safe(repo_path)
+            self.logger.debug("Ref resolution lookup failed for", repo_url, e)
 
         if (
             self.is_clean(repo_path)
@@ -676,7 +1112,7 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
 
         # STILL dirty OR ref mismatch => fall back to backup+re-clone.
         if (repo_path / ".git").exists():
-            self.logger.debug(f"Using existing local clone at {repo_path}")
+            self.logger.debug("Using existing local clone at", repo_path)
             return self._backup_then_reclone(repo_url, repo_name, desired_ref)
 
         cleaned = self._auto_clean_if_dirty(repo_name)
@@ -691,7 +1127,7 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         """Stash local changes in the given repository."""
         repo_root = self.repos_dir / repo_name
         self.logger.info(f"Stashing local changes in {repo_root}")
-        result = self.run("git stash", check=False, cwd=repo_root)
+        result = self.run(("git", "stash"), check=False, cwd=repo_root)
         return self.handle_result(
             result,
             f"Failed to stash changes in {repo_name}: ",
@@ -704,7 +1140,9 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         self.logger.warning(
             f"Discarding local changes in {repo_root} with 'git reset --hard HEAD'"
         )
-        result = self.run("git reset --hard HEAD", check=False, cwd=repo_root)
+        result = self.run(
+            ("git", "reset", "--hard", "HEAD"), check=False, cwd=repo_root
+        )
         return self.handle_result(
             result,
             f"Failed to reset repository {repo_name}: ",
@@ -716,25 +1154,37 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         If multiple tags share the given prefix, the highest semver tag is used.
         """
         repo_root = self.repos_dir / repo_name
+        cached = self._ref_cache.get(self._cache_key(repo_root), {})
+        if ref in cached:
+            return cached[ref]
+        sha = self._resolve_ref_to_sha(repo_name, ref)
+        if sha is not None:
+            self._ref_cache.setdefault(self._cache_key(repo_root), {})[ref] = sha
+        return sha
+
+    def _resolve_ref_to_sha(self, repo_name: str, ref: str) -> Optional[str]:
+        repo_root = self.repos_dir / repo_name
+        # Commits already present locally cannot move,  so skip the tag fetch.
+        if (
+            self._is_commit_hash(ref)
+            and self._session(repo_root).type_of(ref.lower()) == "commit"
+        ):
+            return ref.lower()
         self.logger.info(f"Resolving ref '{ref}' to SHA in {repo_root}")
-        # Fetch latest tags and refs
-        self.git_fetch_tags(repo_root, check=False)
         all_tags = self.fetch_sorted_tags(repo_root)
         # Filter tags that start with the provided ref as a prefix
         matching_tags = [t for t in all_tags if t.startswith(ref)]
         if matching_tags:
             best_tag = matching_tags[0]  # already highest due to sorting
             self.logger.info(f"Selected patch tag '{best_tag}' for ref prefix '{ref}'.")
-            result = self.run(f"git rev-parse {best_tag}", check=False, cwd=repo_root)
-            if result.returncode == 0:
-                return result.stdout.strip()
+            if sha := self._rev_parse(repo_root, best_tag):
+                return sha
             self.logger.error(
                 f"Failed to resolve selected tag '{best_tag}' in repo {repo_name}."
             )
         # Fallback: try resolving ref directly (branch name or commit hash)
-        result = self.run(f"git rev-parse {ref}", check=False, cwd=repo_root)
-        if result.returncode == 0:
-            return result.stdout.strip()
+        if sha := self._rev_parse(repo_root, ref):
+            return sha
         self.logger.error(f"Failed to resolve ref '{ref}' in repo {repo_name}")
         return None
 
@@ -744,7 +1194,7 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         """
         # Ensure we have latest tags
         self.git_fetch_tags(repo_path, check=False)
-        result = self.run("git tag -l", check=False, cwd=repo_path)
+        result = self.run(("git", "tag", "-l"), check=False, cwd=repo_path)
         if result.returncode != 0:
             self.logger.error(f"Failed to list tags in {repo_path}")
             return []
@@ -755,7 +1205,8 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
 
     def _is_commit_hash(self, ref: str) -> bool:
         """Check if a string looks like a commit hash (40-char hex)."""
-        return len(ref) == 40 and all(c in "0123456789abcdefABCDEF" for c in ref)
+        # Deleting every hex digit in one C-level pass leaves nothing for a hash.
+        return len(ref) == 40 and not ref.encode().translate(None, HEX_DIGITS)
 
     def resolve_ref_to_entry(
         self, repo_name: str, ref: str
@@ -767,20 +1218,16 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         For direct branch/tag names, matched is the input ref itself.
         """
         repo_root = self.repos_dir / repo_name
-        # Fetch latest tags and refs
-        self.git_fetch_tags(repo_root, check=False)
         all_tags = self.fetch_sorted_tags(repo_root)
         # Filter tags that start with the provided ref as a prefix
         matching_tags = [t for t in all_tags if t.startswith(ref)]
         if matching_tags:
             best_tag = matching_tags[0]  # already highest due to sorting
-            result = self.run(f"git rev-parse {best_tag}", check=False, cwd=repo_root)
-            if result.returncode == 0:
-                return (best_tag, result.stdout.strip())
+            if sha := self._rev_parse(repo_root, best_tag):
+                return (best_tag, sha)
         # Fallback: try resolving ref directly (branch name or commit hash)
-        result = self.run(f"git rev-parse {ref}", check=False, cwd=repo_root)
-        if result.returncode == 0:
-            return (ref, result.stdout.strip())
+        if sha := self._rev_parse(repo_root, ref):
+            return (ref, sha)
         self.logger.error(f"Failed to resolve ref '{ref}' in repo {repo_name}")
         return None
 
@@ -802,50 +1249,69 @@ class RepositoryManager(WranglerConfigurable, WranglerLoggable, WranglerEnvable)
         """
         resolved_repo_states = {}
         resolved_ref_names: Dict[str, Optional[str]] = {}
-        for repo_url, desired_ref in repos_to_prepare.items():
-            if not self.prepare_repository(repo_url, desired_ref):
-                raise RuntimeError(f"Failed to prepare repository {repo_url}")
-
-            # Get the actual hash after preparation
-            repo_path = self._repo_path(repo_url)
-            current_sha = self.get_hash(repo_path)
-            if not current_sha:
-                raise RuntimeError(
-                    f"Could not get current SHA for {repo_url} after preparation."
-                )
+
+        def prepare_one(item: tuple[str, str]) -> tuple[str, Dict[str, Optional[str]]]:
+            try:
+                return self._prepare_repository_state(*item)
+            finally:
+                self._close_session(self._repo_path(item[0]))
+
+        results = self._map_repos(
+            prepare_one,
+            list(repos_to_prepare.items()),
+            key=lambda item: self._repo_path(item[0]),
+        )
+        for repo_url, (current_sha, ref_name) in zip(repos_to_prepare, results):
             resolved_repo_states[repo_url] = current_sha
+            resolved_ref_names.update(ref_name)
+        return resolved_repo_states, resolved_ref_names
 
-            # Capture the matched ref name using the same logic as resolve_ref_to_sha
-            is_hash = self._is_commit_hash(desired_ref)
-            if is_hash:
-                resolved_ref_names[repo_url] = None
-            else:
-                repo_name = repo_path.name
-                matched_entry = self.resolve_ref_to_entry(repo_name, desired_ref)
-                if matched_entry:
-                    resolved_ref_names[repo_url] = matched_entry[0]
+    def _prepare_repository_state(
+        self, repo_url: str, desired_ref: str
+    ) -> tuple[str, Dict[str, Optional[str]]]:
+        """Prepare one repository returning its current SHA and a possibly empty
+        {repo_url: matched_ref_name} dict.
+        """
+        if not self.prepare_repository(repo_url, desired_ref):
+            raise RuntimeError(f"Failed to prepare repository {repo_url}")
 
-        return resolved_repo_states, resolved_ref_names
+        # Get the actual hash after preparation
+        repo_path = self._repo_path(repo_url)
+        current_sha = self.get_hash(repo_path)
+        if not current_sha:
+            raise RuntimeError(
+                f"Could not get current SHA for {repo_url} after preparation."
+            )
+
+        # Capture the matched ref name using the same logic as resolve_ref_to_sha
+        if self._is_commit_hash(desired_ref):
+            return current_sha, {repo_url: None}
+        matched_entry = self.resolve_ref_to_entry(repo_path.name, desired_ref)
+        if matched_entry:
+            return current_sha, {repo_url: matched_entry[0]}
+        return current_sha, {}
 
     def clean_repo(self, repo_path: Path, patterns: list[str]) -> bool:
         """Clean up specified patterns in a cloned repository."""
-        self.logger.debug(f"Cleaning patterns {patterns} in repository {repo_path}.")
+        self.logger.debug("Cleaning patterns", patterns, "in repository", repo_path)
         try:
             if not repo_path.exists():
-                self.logger.debug(f"Skipping clean for nonexistent: {repo_path}")
+                self.logger.debug("Skipping clean for nonexistent:", repo_path)
                 return True
 
             for pattern in patterns:
                 for path in repo_path.rglob(pattern):
                     if path.is_dir():
-                        self.logger.debug(f"Deleting directory: {path}")
+                        self.logger.debug("Deleting directory:", path)
                         shutil.rmtree(path)
                     else:
-                        self.logger.debug(f"Deleting file: {path}")
+                        self.logger.debug("Deleting file:", path)
                         path.unlink()
             return True
         except Exception as e:
             return self.logger.exception(e, f"Error during cleaning of {repo_path}:")
+        finally:
+            self._invalidate(repo_path)
 
     def clean_repos(self, urls: list[str], patterns: list[str]) -> bool:
         """Clean up specified patterns in cloned repositories."""
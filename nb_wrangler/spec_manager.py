@@ -1,15 +1,18 @@
+import io
 import os
 import re
 import datetime
-from typing import Any, Optional
+import functools
+from typing import IO, Any, Optional
 from pathlib import Path
 import copy
+from concurrent.futures import ThreadPoolExecutor
 
 from . import utils
 from . import yaml_typed_values
 from .logger import WranglerLoggable, get_configured_logger
 from .config import WranglerConfigurable  # Import WranglerConfigurable
-from .constants import DEFAULT_ARCHIVE_FORMAT
+from .constants import DEFAULT_ARCHIVE_FORMAT, NOTEBOOK_SCAN_JOBS
 from .spec_validator import SpecValidator
 
 _OVERRIDES_SCHEMA: dict[str, Any] = {
@@ -35,6 +38,34 @@ _OVERRIDES_SCHEMA: dict[str, Any] = {
     },
 }
 
+_SHA256_PLACEHOLDER = "spec_sha256: ''\n"
+_SHA256_RE = re.compile("[a-f0-9]{64}")
+_IMAGE_NAME_RE = re.compile(r"[a-zA-Z0-9\-_][a-zA-Z0-9\-_\.]{1,128}")
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+# Always excluded from notebook selections.
+_CHECKPOINT_REGEX = r"(^|/)\.ipynb_checkpoints(/|/.*-checkpoint\.ipynb$)"
+# Never walked for notebooks:  checkpoints are always excluded and .git is big.
+_PRUNED_DIRS = frozenset({".git", ".ipynb_checkpoints"})
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_alternatives(regexes: tuple[str, ...]) -> tuple[re.Pattern, ...]:
+    """Compile `regexes` as one alternation so each path is scanned once.
+
+    Falls back to one pattern per regex when joining could change their meaning,
+    i.e. for backreferences or inline flags which only apply at the start.
+    Cached since selection blocks commonly share include/exclude lists.
+    """
+    patterns = tuple(re.compile(regex) for regex in regexes)
+    if len(patterns) > 1 and not any(map(_BACKREF_RE.search, regexes)):
+        try:
+            return (re.compile("|".join(f"(?:{regex})" for regex in regexes)),)
+        except re.error:
+            pass
+    return patterns
+
 
 class SpecManager(
     WranglerLoggable, WranglerConfigurable
@@ -350,8 +381,8 @@ class SpecManager(
     @property
     def moniker(self) -> str:
         """Get a filesystem-safe version of the image name."""
-        assert re.match(
-            r"[a-zA-Z0-9\-_][a-zA-Z0-9\-_\.]{1,128}", self.image_name
+        assert _IMAGE_NAME_RE.match(
+            self.image_name
         ), "Invalid characters in image_name,  onlow letters, numbers, dashes, underscores, and dots are allowed, and it must be 1-255 characters long.  No leading dots."
         return self.image_name.replace(" ", "-")  # + "-" + self.kernel_name
 
@@ -459,24 +490,30 @@ class SpecManager(
 
     def outputs_exist(self, *output_names: str) -> bool:
         """Check if all specified outputs exist in the spec already."""
-        return "out" in self._spec and all(
-            name in self._spec["out"] for name in output_names
-        )
+        out = self._spec.get("out")
+        return out is not None and out.keys() >= set(output_names)
 
     def files_exist(self, *filepaths: str | Path) -> bool:
         """Check if all specified files exist in the filesystem."""
-        return all(Path(filepath).exists() for filepath in filepaths)
+        return all(map(os.path.exists, filepaths))
 
     # Raw read/write access for backward compatibility or special cases
     def to_dict(self) -> dict[str, Any]:
         """Return the raw spec dictionary."""
-        return copy.deepcopy(self._spec)
+        return utils.fast_clone(self._spec)
 
     def to_string(self) -> str:
-        output_str = utils.yaml_dumps(self._spec)
+        with io.StringIO() as string_stream:
+            self.write_spec(string_stream)
+            return string_stream.getvalue()
+
+    def write_spec(self, stream: IO[str]) -> None:
+        """Dump the spec, and its inline mamba spec document if any, to `stream`."""
+        yaml = utils.get_yaml()
+        yaml.dump(self._spec, stream)
         if hasattr(self, "inline_mamba_spec") and self.inline_mamba_spec is not None:
-            output_str += "\n---\n" + utils.yaml_dumps(self.inline_mamba_spec)
-        return output_str
+            stream.write("\n---\n")
+            yaml.dump(self.inline_mamba_spec, stream)
 
     # ----------------------------- load, save, outputs  ---------------------------
 
@@ -521,7 +558,7 @@ class SpecManager(
         if "out" not in self._spec:
             self._spec["out"] = dict()
         self._spec["out"][key] = value
-        self.logger.debug(f"setting output data: {key} -> {value}")
+        self.logger.debug("setting output data:", key, "->", value)
 
     # -------------------------------- saving & resetting spec -------------------------------
 
@@ -543,28 +580,34 @@ class SpecManager(
     ) -> bool:
         """Save the current YAML spec to a file."""
         self.logger.debug(f"Saving spec file to {output_filepath}.")
+        temp_path = None
         try:
             output_path = Path(output_filepath)
             self.refresh_date_updated()
             if add_sha256:
-                hash = self.add_sha256()
+                hash, spec_text = self._add_sha256()
                 self.logger.debug(f"Setting spec_sha256 to {hash}.")
             else:
                 self.system.pop("spec_sha256", None)
                 self.logger.debug(
                     "Not updating spec_sha256 sum; Removing potentially outdated sum."
                 )
-            if output_path.exists():
-                self.logger.debug(
-                    f"Output file {output_filepath} already exists and will be removed and overwritten."
-                )
-                output_path.unlink()  # Remove existing file if it
+                spec_text = None
+            # Write beside the target then rename over it so an existing spec is
+            # replaced atomically and never left missing or truncated.
+            temp_path = output_path.with_name(output_path.name + ".tmp")
             self.logger.debug(f"Writing spec to {output_filepath}.")
-            with output_path.open("w+") as f:
-                f.write(self.to_string())
+            with temp_path.open("w") as f:
+                if spec_text is None:
+                    self.write_spec(f)
+                else:
+                    f.write(spec_text)
+            os.replace(temp_path, output_path)
             self.logger.debug(f"Spec file saved to {output_filepath}.")
             return True
         except Exception as e:
+            if temp_path is not None:
+                temp_path.unlink(missing_ok=True)
             return self.logger.exception(
                 e, f"Error saving YAML spec file to {output_filepath}: {e}"
             )
@@ -636,14 +679,28 @@ class SpecManager(
         if hash is None:
             self.logger.debug("Spec has no_spec_sha256 hash for verifying integrity.")
             return None
-        if len(hash) != 64 or not re.match("[a-z0-9]{64}", hash):
+        if not _SHA256_RE.fullmatch(hash):
             self.logger.warning(f"System spec_sha256 hash '{hash}' is malformed.")
         return hash
 
     def add_sha256(self) -> str:
+        return self._add_sha256()[0]
+
+    def _add_sha256(self) -> tuple[str, str]:
+        """Set system.spec_sha256 and return it along with the spec text it is in.
+
+        The hash covers the spec serialized with an empty spec_sha256.  Rather
+        than serializing the whole spec a second time,  the hash is substituted
+        into that text when it would be dumped as a plain YAML scalar and the
+        empty placeholder occurs exactly once.
+        """
         self.system["spec_sha256"] = ""
-        self.system["spec_sha256"] = utils.sha256_str(self.to_string())
-        return self.system["spec_sha256"]
+        unhashed = self.to_string()
+        hash = utils.sha256_str(unhashed)
+        self.system["spec_sha256"] = hash
+        if unhashed.count(_SHA256_PLACEHOLDER) == 1 and utils.is_plain_yaml_str(hash):
+            return hash, unhashed.replace(_SHA256_PLACEHOLDER, f"spec_sha256: {hash}\n")
+        return hash, self.to_string()
 
     def validate_sha256(self) -> bool:
         """Validate the sha256 hash of the spec which proves integrity unless we've been hacked."""
@@ -663,21 +720,24 @@ class SpecManager(
 
     # ---------------------------- validation ----------------------------------
 
+    # Keyword-name allow lists are frozensets since they are only probed for membership.
     ALLOWED_KEYWORDS: dict[str, Any] = {
         "dev_overrides": _OVERRIDES_SCHEMA,
         "deactivated_dev_overrides": _OVERRIDES_SCHEMA,
-        "image_spec_header": [
-            "image_name",
-            "description",
-            "valid_on",
-            "expires_on",
-            "python_version",
-            "deployment_name",
-            "kernel_name",
-            "display_name",
-            "manager",
-        ],
-        "repositories": ["url", "ref"],
+        "image_spec_header": frozenset(
+            {
+                "image_name",
+                "description",
+                "valid_on",
+                "expires_on",
+                "python_version",
+                "deployment_name",
+                "kernel_name",
+                "display_name",
+                "manager",
+            }
+        ),
+        "repositories": frozenset({"url", "ref"}),
         # Assets supports two syntaxes:
         # 1) Flat list of dicts with keys repo, ref, source, destination (and optional contents_only).
         #    Example: [{"repo":"...","ref":"main","source":"/a/","destination":"/b"}]
@@ -693,10 +753,10 @@ class SpecManager(
                 "contents_only": None,
             }
         ],
-        "refdata_dependencies": ["install_files", "other_variables"],
+        "refdata_dependencies": frozenset({"install_files", "other_variables"}),
         "environment_vars": None,
         "test_environment_vars": None,
-        "environment_spec": ["uri", "repo", "path"],
+        "environment_spec": frozenset({"uri", "repo", "path"}),
         "extra_mamba_packages": [],
         "common_mamba_packages": [],
         "extra_pip_packages": [],
@@ -704,24 +764,28 @@ class SpecManager(
         "apt_packages": [],
         "dockerfile_aux_sh": None,
         "override_pip_versions": [],
-        "selected_notebooks": [
-            "repo",
-            "root_directory",
-            "include_subdirs",
-            "exclude_subdirs",
-            "tests",
-        ],
-        "out": [
-            "repositories",
-            "test_notebooks",
-            "spi_packages",
-            "mamba_spec",
-            "pip_requirement_files",
-            "pip_map",
-            "package_versions",
-            "data",
-        ],
-        "commands": ["mamba", "pip", "favor"],
+        "selected_notebooks": frozenset(
+            {
+                "repo",
+                "root_directory",
+                "include_subdirs",
+                "exclude_subdirs",
+                "tests",
+            }
+        ),
+        "out": frozenset(
+            {
+                "repositories",
+                "test_notebooks",
+                "spi_packages",
+                "mamba_spec",
+                "pip_requirement_files",
+                "pip_map",
+                "package_versions",
+                "data",
+            }
+        ),
+        "commands": frozenset({"mamba", "pip", "favor"}),
         "system": {
             "commands": {
                 "mamba": None,
@@ -807,24 +871,43 @@ class SpecManager(
         """Collect paths to all notebooks specified by the spec."""
         self._ensure_validated()
         notebook_paths: dict[str, str] = {}
+        repositories = self.repositories  # dev mode merges on every access
+        # Selection blocks usually share a few repos;  locate each clone once.
+        clone_dirs: dict[str, tuple[Path, bool]] = {}
+        scans: list[tuple[str, dict, Path]] = []
         for name, selection in self.notebook_selections.items():
             repo_name = selection["repo"]
-            if repo_name not in self.repositories:
+            if repo_name not in repositories:
                 raise RuntimeError(
                     f"Unknown repository '{repo_name}' in selection block '{name}'"
                 )
-            repo_url = self.repositories[repo_name]["url"]
-            clone_dir = self._get_repo_dir(repos_dir, repo_url)
-            if not clone_dir.exists():
+            if repo_name not in clone_dirs:
+                repo_url = repositories[repo_name]["url"]
+                clone_dir = self._get_repo_dir(repos_dir, repo_url)
+                clone_dirs[repo_name] = (clone_dir, clone_dir.exists())
+            clone_dir, clone_exists = clone_dirs[repo_name]
+            if not clone_exists:
                 self.logger.error(
                     f"Repository '{repo_name}' not set up at: {clone_dir}"
                 )
                 continue
+            scans.append((name, selection, clone_dir))
+
+        # Directory walks are I/O bound so scan selections concurrently,  then
+        # merge in spec order so the first selection still wins duplicates.
+        def scan(item: tuple[str, dict, Path]) -> set[str]:
+            _name, selection, clone_dir = item
             root_dir = selection.get("root_directory", "")
-            found_notebooks = self._process_directory_entry(
-                selection, clone_dir, root_dir
-            )
+            return self._process_directory_entry(selection, clone_dir, root_dir)
 
+        jobs = max(1, min(len(scans), NOTEBOOK_SCAN_JOBS))
+        if jobs == 1:
+            found = [scan(item) for item in scans]
+        else:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                found = list(executor.map(scan, scans))
+
+        for (name, _selection, _clone_dir), found_notebooks in zip(scans, found):
             for notebook_path in found_notebooks:
                 if notebook_path in notebook_paths:
                     self.logger.warning(
@@ -864,53 +947,76 @@ class SpecManager(
         if root_directory:
             base_path = base_path / root_directory
 
-        possible_notebooks = [str(path) for path in base_path.glob("**/*.ipynb")]
+        possible_notebooks = self._find_notebook_files(str(base_path))
 
-        include_subdirs = list(entry.get("include_subdirs", [r"."]))
-        included_notebooks = self._matching_files(
-            "Including", possible_notebooks, include_subdirs
+        include_subdirs = tuple(entry.get("include_subdirs", [r"."]))
+        exclude_subdirs = (*entry.get("exclude_subdirs", []), _CHECKPOINT_REGEX)
+        self.logger.debug(
+            "Filtering notebooks",
+            possible_notebooks,
+            "including regexes",
+            include_subdirs,
+            "excluding regexes",
+            exclude_subdirs,
         )
+        includes = _compile_alternatives(include_subdirs)
+        excludes = _compile_alternatives(exclude_subdirs)
 
-        exclude_subdirs = list(entry.get("exclude_subdirs", []))
-        exclude_subdirs.append(r"(^|/)\.ipynb_checkpoints(/|/.*-checkpoint\.ipynb$)")
-        excluded_notebooks = self._matching_files(
-            "Excluding", possible_notebooks, exclude_subdirs
-        )
+        # One pass,  checking excludes first so excluded paths skip the includes.
+        remaining_notebooks = set()
+        for nb_path in possible_notebooks:
+            if self._first_match("Excluding", excludes, nb_path):
+                continue
+            if self._first_match("Including", includes, nb_path):
+                remaining_notebooks.add(nb_path)
 
-        remaining_notebooks = included_notebooks - excluded_notebooks
         self.logger.info(
             f"Selected {len(remaining_notebooks)} notebooks under {base_path} for selection block."
         )
 
         return remaining_notebooks
 
-    def _matching_files(
-        self, verb: str, possible_notebooks: list[str], regexes: list[str]
-    ) -> set[str]:
-        """Filter notebook paths by matching against a list of regex patterns.
-
-        Args:
-            verb: Log action verb (e.g., 'Including', 'Excluding') for log messages.
-            possible_notebooks: List of notebook file paths to filter.
-            regexes: List of regex patterns. A notebook is matched if any pattern
-                matches its path.
+    def _find_notebook_files(self, base_dir: str) -> list[str]:
+        """Return the paths of all *.ipynb files under `base_dir`.
 
-        Returns:
-            Set of notebook paths that matched at least one regex pattern.
+        Equivalent to Path.glob("**/*.ipynb") restricted to files,  but walks with
+        os.scandir so the directory entries' cached types avoid a stat per path.
+        Like glob,  symlinked directories are not descended into,  nor are
+        .git or .ipynb_checkpoints directories.
         """
-        self.logger.debug(
-            f"{verb} notebooks {list(possible_notebooks)} against regexes {regexes}"
-        )
-        notebooks = set()
-        for nb_path in possible_notebooks:
-            if not Path(nb_path).is_file():
-                self.logger.debug(f"Skipping {verb} non-file: {nb_path}")
+        notebooks = []
+        pending = [base_dir]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in _PRUNED_DIRS:
+                                pending.append(entry.path)
+                        elif entry.name.endswith(".ipynb"):
+                            if entry.is_file():
+                                notebooks.append(entry.path)
+                            else:
+                                self.logger.debug("Skipping non-file:", entry.path)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
                 continue
-            for regex in regexes:
-                if re.search(regex, str(nb_path)):
-                    self.logger.debug(
-                        f"{verb} notebook {nb_path} based on regex: '{regex}'"
-                    )
-                    notebooks.add(str(nb_path))
-                    break
         return notebooks
+
+    def _first_match(
+        self, verb: str, patterns: tuple[re.Pattern, ...], nb_path: str
+    ) -> re.Pattern | None:
+        """Return the first of `patterns` found in `nb_path`, or None.
+
+        Args:
+            verb: Log action verb (e.g., 'Including', 'Excluding') for log messages.
+            patterns: Compiled regexes from _compile_alternatives.
+            nb_path: Notebook file path to test.
+        """
+        for pattern in patterns:
+            if pattern.search(nb_path):
+                self.logger.debug(
+                    verb, "notebook", nb_path, f"based on regex: '{pattern.pattern}'"
+                )
+                return pattern
+        return None
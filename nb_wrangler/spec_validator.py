@@ -256,6 +256,7 @@ class SpecValidator(WranglerLoggable):
         no_errors = True
         if not self.sm.notebook_selections:
             self.logger.debug("selected_notebooks is not specified.")
+        repositories = self.sm.repositories
         for name, selection in self.sm.notebook_selections.items():
             for key in selection:
                 if key not in self.sm.ALLOWED_KEYWORDS["selected_notebooks"]:
@@ -266,7 +267,7 @@ class SpecValidator(WranglerLoggable):
                 no_errors = self.logger.error(
                     f"Missing required 'repo' field in notebook selection '{name}'."
                 )
-            elif selection["repo"] not in self.sm.repositories:
+            elif selection["repo"] not in repositories:
                 no_errors = self.logger.error(
                     f"Unknown repo '{selection['repo']}' in notebook selection '{name}'."
                 )
@@ -2,6 +2,7 @@
 
 import os
 import io
+import logging
 import re
 import urllib.parse
 import glob
@@ -13,34 +14,57 @@ import hashlib
 import time
 import shutil
 import subprocess
+import threading
 from dataclasses import dataclass
 from pathlib import Path
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from ruamel.yaml import YAML, scalarstring  # type: ignore[import]
 from ruamel.yaml import YAMLError  # noqa: F401
+from ruamel.yaml.nodes import ScalarNode  # type: ignore[import]
 
 # from . import config
 
 
 # NOTE: to keep this module easily importable everywhere in our code, avoid nb_wrangler imports
 
+log = logging.getLogger(__name__)
+
 # --------------------------- YAML helpers to isolate ruamel.yaml details -------------------
 
 
+_yaml_local = threading.local()
+
+
 def get_yaml() -> YAML:
     """Return configured ruamel.yaml instance. A chief goal here is that whatever
     format we pick, it should (a) round trip well and (b) be as readable as possible.
     To that end, spec order should be preserved, and support for cleanly formatted
     multi-line strings should be as easy as possible. Wranglers should be able to look
     at git diffs and clearly understand what is *really* changing
+
+    Round tripping rules out the C loader,  but the instance is cached per thread
+    since building one costs more than dumping a small document.
     """
-    yaml = YAML()
-    yaml.preserve_quotes = True
-    yaml.indent(mapping=2, sequence=4, offset=2)
+    yaml = getattr(_yaml_local, "yaml", None)
+    if yaml is None:
+        yaml = YAML()
+        yaml.preserve_quotes = True
+        yaml.indent(mapping=2, sequence=4, offset=2)
+        _yaml_local.yaml = yaml
     return yaml
 
 
+def is_plain_yaml_str(value: str) -> bool:
+    """True if `value` would be emitted as an unquoted YAML string scalar."""
+    return (
+        get_yaml().resolver.resolve(ScalarNode, value, (True, False))
+        == "tag:yaml.org,2002:str"
+    )
+
+
 def yaml_dumps(obj) -> str:
     """Convert an object, e.g. a wrangler spec, to our YAML format."""
     with io.StringIO() as string_stream:
@@ -56,22 +80,26 @@ def yaml_block(s):
 # -----------------------------------------------------------------------------
 
 
+def fast_clone(obj):
+    """Deep copy the plain dict/list/scalar trees loaded from YAML specs.
+
+    Much cheaper than copy.deepcopy since there is no memo or per-type
+    dispatch;  mappings and sequences come back as plain dicts and lists
+    while scalars, which are immutable, are shared.
+    """
+    if isinstance(obj, dict):
+        return {key: fast_clone(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [fast_clone(value) for value in obj]
+    return obj
+
+
 def remove_common_prefix(strings: list[str]) -> list[str]:
     """Remove common prefix from a list of strings."""
     if not strings:
         return []
-
-    # Find the shortest string to avoid index out of range
-    shortest = min(strings, key=len)
-    prefix_length = 0
-
-    for i in range(len(shortest)):
-        if all(s.startswith(shortest[: i + 1]) for s in strings):
-            prefix_length = i + 1
-        else:
-            break
-
-    # Remove the common prefix
+    # commonprefix compares character by character,  not by path component.
+    prefix_length = len(os.path.commonprefix(strings))
     return [s[prefix_length:] for s in strings]
 
 
@@ -172,8 +200,8 @@ def uri_to_local_path(uri: str, timeout: int = 30) -> str:
 
     For S3,  you must already have any required AWS credentials.
 
-    Currently intended for small quick downloads only due to lack of
-    chunking and/or parallelism.
+    HTTP(S) downloads are streamed to disk in chunks but not parallelized,
+    and only appear under their final name once complete.
 
     Return the local path.
     """
@@ -194,17 +222,25 @@ def uri_to_local_path(uri: str, timeout: int = 30) -> str:
 
     # Check for HTTP or HTTPS URI
     elif scheme in ["http", "https"]:
+        # Generate a filename from the last element of the URI path
+        filename = os.path.basename(parsed_uri.path)
+        partial = filename + ".part"
         try:
-            response = requests.get(uri, timeout=timeout, allow_redirects=True)
-            response.raise_for_status()
-            # Generate a filename from the last element of the URI
-            filename = os.path.basename(uri)
-            with open(filename, "w+") as f:
-                f.write(response.text)
+            with get_http_session().get(
+                uri, timeout=timeout, allow_redirects=True, stream=True
+            ) as response:
+                response.raise_for_status()
+                with open(partial, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=1 << 16):
+                        f.write(chunk)
+            os.replace(partial, filename)
             return filename
         except requests.exceptions.RequestException as e:
-            print(f"Error downloading file: {e}")
+            log.error("Error downloading file: %s", e)
             raise e
+        finally:
+            # Never leave a truncated download behind
+            Path(partial).unlink(missing_ok=True)
     # If URI doesn't match any of the supported types
     else:
         raise ValueError(f"Unsupported URI scheme '{scheme}' for spec {uri}")
@@ -224,7 +260,7 @@ def get_head_info(url: str, timeout: int = 30) -> HeadInfo:
     """Return (size, etag, last-modified) for a URL based on HTTP HEAD,
     nominally for a data file.
     """
-    response = requests.head(url, timeout=timeout, allow_redirects=True)
+    response = get_http_session().head(url, timeout=timeout, allow_redirects=True)
     response.raise_for_status()
     d = dict(response.headers.items())
     return HeadInfo(int(d["content-length"]), d["etag"], d["last-modified"])
@@ -236,22 +272,45 @@ def get_head_info(url: str, timeout: int = 30) -> HeadInfo:
 def once(func):
     """
     A decorator that ensures a function is executed only once.
-    Subsequent calls return the cached result.
+    Subsequent calls return the cached result.  Concurrent first calls
+    wait for the one that runs `func` rather than running it again.
     """
     _has_run = False
     _result = None
+    _lock = threading.Lock()
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         nonlocal _has_run, _result
         if not _has_run:
-            _result = func(*args, **kwargs)
-            _has_run = True
+            with _lock:
+                if not _has_run:
+                    _result = func(*args, **kwargs)
+                    _has_run = True
         return _result
 
     return wrapper
 
 
+@once
+def get_http_session() -> requests.Session:
+    """Return the shared HTTP session so repeated requests to a host reuse
+    pooled keep-alive connections,  retrying transient server errors.
+    """
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["HEAD", "GET"],
+        raise_on_status=False,  # leave the final error to raise_for_status()
+    )
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 # -------------------------------------------------------------------------
 
 
@@ -264,9 +323,7 @@ def files_to_map(files: list[str]) -> dict[str, list[str]]:
     mapping = dict()
     for f in files:
         with open(f) as opened:
-            lines = opened.read().splitlines()
-            lines = [line.strip() for line in lines]
-        mapping[f] = lines
+            mapping[f] = list(map(str.strip, opened.read().splitlines()))
     return mapping
 
 
@@ -297,18 +354,16 @@ def sha256_str(text: str) -> str:
 
 
 def sha256_file(filepath) -> str:
-    """This is for multi-M or multi-G data tarballs..."""
-    sha256_hash = hashlib.sha256()
+    """This is for multi-M or multi-G data tarballs...
+
+    hashlib.file_digest runs the read/update loop in C with a large buffer.
+    """
     with open(filepath, "rb") as f:
-        # Read and update hash string value in blocks
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
+        return hashlib.file_digest(f, "sha256").hexdigest()
 
 
 def sha256_verify_file(filepath: str, expected_hash: str) -> bool:
-    with open(filepath, "rb") as opened:
-        return sha256_bytes(opened.read()) == expected_hash
+    return sha256_file(filepath) == expected_hash
 
 
 def sha256_verify_data(data: bytes, expected_hash: str) -> bool:
@@ -394,6 +449,9 @@ def copy_shared_modules(path_pattern: str, target_dir: str | Path):
             )
 
 
+_VAR_REF_RE = re.compile(r"\$(\w+)|\${(\w+)(?::-([^}]*))?}|{(\w+)}")
+
+
 def resolve_vars(template: str, mapping: dict[str, str]) -> str:
     """
     Resolve a `template` into a fully resolved string by replacing variable
@@ -411,6 +469,8 @@ def resolve_vars(template: str, mapping: dict[str, str]) -> str:
 
     returns (fully resolved template with respect to mapping)
     """
+    if "$" not in template and "{" not in template:
+        return template  # nothing to resolve
 
     def _replacer(m):
         # group(1): $VAR
@@ -430,11 +490,7 @@ def resolve_vars(template: str, mapping: dict[str, str]) -> str:
         # If no value and no default, return the original match (or empty string if we want to be strict)
         return val if val is not None else m.group(0)
 
-    return re.sub(
-        r"\$(\w+)|\${(\w+)(?::-([^}]*))?}|{(\w+)}",
-        _replacer,
-        template,
-    )
+    return _VAR_REF_RE.sub(_replacer, template)
 
 
 def resolve_env(
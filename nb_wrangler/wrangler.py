@@ -623,10 +623,11 @@ class NotebookWrangler(WranglerConfigurable, WranglerLoggable, WranglerEnvable):
 
             if self.config.dev:
                 # In dev mode, we want to allow dev_overrides to take precedence over locked refs
+                # Use the fully-resolved repo info from spec_manager.repositories
+                # which already has the dev_overrides applied.
+                repositories = self.spec_manager.repositories
                 for repo_name in self.spec_manager.dev_overrides_repositories:
-                    # Use the fully-resolved repo info from spec_manager.repositories
-                    # which already has the dev_overrides applied.
-                    repo_info = self.spec_manager.repositories.get(repo_name)
+                    repo_info = repositories.get(repo_name)
                     if repo_info:
                         url = repo_info.get("url")
                         ref = repo_info.get("ref")
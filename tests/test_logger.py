@@ -82,6 +82,15 @@ class TestWranglerLogger:
         result = logger.info("info msg")
         assert result is True
 
+    def test_debug_skips_formatting_when_disabled(self):
+        logger = WranglerLogger(quiet=True, verbose=False)
+
+        class Unformattable:
+            def __str__(self):
+                raise AssertionError("formatted while DEBUG disabled")
+
+        assert logger.debug("value:", Unformattable()) is None
+
     def test_elapsed_time_returns_string(self):
         logger = WranglerLogger(quiet=True, debug_mode=False)
         elapsed = str(logger.elapsed_time)
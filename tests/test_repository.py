@@ -0,0 +1,607 @@
+"""Tests for nb_wrangler/repository.py git command handling."""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from nb_wrangler.repository import (
+    GIT_ORIGIN_BRANCHES_REFSPEC,
+    RepositoryManager,
+    _GitSession,
+)
+
+from .conftest import _base_config
+
+
+def _make_repo_manager(tmp_path):
+    _base_config(tmp_path)
+    rm = RepositoryManager(repos_dir=tmp_path / "repos")
+    rm.env_manager = MagicMock()
+    rm.mirrors_dir = tmp_path / "mirrors"
+    return rm
+
+
+class TestGitEnv:
+    def test_non_git_command_inherits_environment(self):
+        assert RepositoryManager._git_env("gh pr create") is None
+
+    def test_readonly_command_skips_optional_locks(self, monkeypatch):
+        monkeypatch.delenv("GIT_OPTIONAL_LOCKS", raising=False)
+        monkeypatch.delenv("GIT_TERMINAL_PROMPT", raising=False)
+        env = RepositoryManager._git_env("git status --porcelain")
+        assert env["GIT_OPTIONAL_LOCKS"] == "0"
+        assert env["GIT_TERMINAL_PROMPT"] == "0"
+
+    def test_mutating_command_keeps_locks_and_prompts(self):
+        assert RepositoryManager._git_env(("git", "checkout", "main")) is None
+        assert RepositoryManager._git_env(("git", "push", "origin", "b")) is None
+
+    def test_symbolic_ref_is_not_read_only(self):
+        assert not RepositoryManager._is_readonly_git(
+            ("git", "symbolic-ref", "HEAD", "refs/heads/x")
+        )
+
+    def test_pool_threads_never_prompt(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("GIT_TERMINAL_PROMPT", raising=False)
+        rm = _make_repo_manager(tmp_path)
+        rm.config.clone_jobs = 2
+        clone = ("git", "clone", "https://example.com/repo.git")
+        envs = rm._map_repos(RepositoryManager._git_env, [clone, ("gh", "pr")])
+        assert envs[0]["GIT_TERMINAL_PROMPT"] == "0"
+        assert "GIT_OPTIONAL_LOCKS" not in envs[0]
+        assert envs[1] is None
+        assert RepositoryManager._git_env(clone) is None
+
+    def test_user_environment_takes_precedence(self, monkeypatch):
+        monkeypatch.setenv("GIT_TERMINAL_PROMPT", "1")
+        env = RepositoryManager._git_env("git rev-parse HEAD")
+        assert env["GIT_TERMINAL_PROMPT"] == "1"
+
+    def test_run_passes_env_to_wrangler_run(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.run("git rev-parse HEAD", check=False)
+        _, keys = rm.env_manager.wrangler_run.call_args
+        assert "GIT_TERMINAL_PROMPT" in keys["env"]
+        assert keys["check"] is False
+
+
+class TestConcurrentRepoSetup:
+    def test_prepare_repositories_preserves_order(self, tmp_path, monkeypatch):
+        rm = _make_repo_manager(tmp_path)
+        rm.config.clone_jobs = 4
+        urls = {f"https://example.com/repo{i}.git": "main" for i in range(6)}
+        monkeypatch.setattr(
+            rm,
+            "_prepare_repository_state",
+            lambda url, ref: (url[-9:], {url: ref}),
+        )
+        shas, refs = rm.prepare_repositories(urls)
+        assert list(shas) == list(urls)
+        assert shas["https://example.com/repo3.git"] == "repo3.git"
+        assert refs == urls
+
+    def test_setup_repos_raises_on_failure(self, tmp_path, monkeypatch):
+        rm = _make_repo_manager(tmp_path)
+        monkeypatch.setattr(rm, "_setup_remote_repo", lambda *a, **k: None)
+        with pytest.raises(RuntimeError, match="Failed to setup repository"):
+            rm.setup_repos(["https://example.com/a.git", "https://example.com/b.git"])
+
+    def test_urls_sharing_a_clone_directory_run_serially(self, tmp_path, monkeypatch):
+        rm = _make_repo_manager(tmp_path)
+        rm.config.clone_jobs = 4
+        urls = [
+            "https://example.com/org/foo",
+            "https://example.com/other/bar.git",
+            "https://example.com/org/foo.git",
+        ]
+        active, overlaps, order = set(), [], []
+        lock = threading.Lock()
+
+        def setup_remote_repo(url, **keys):
+            path = rm._repo_path(url)
+            with lock:
+                if path in active:
+                    overlaps.append(url)
+                active.add(path)
+                order.append(url)
+            time.sleep(0.05)
+            with lock:
+                active.discard(path)
+            return path
+
+        monkeypatch.setattr(rm, "_setup_remote_repo", setup_remote_repo)
+        monkeypatch.setattr(rm, "get_hash", lambda path: path.name)
+        assert rm.setup_repos(urls) == {url: rm._repo_path(url).name for url in urls}
+        assert overlaps == []
+        assert order.index(urls[0]) < order.index(urls[2])
+
+    def test_lookup_sessions_are_closed_per_repo(self, tmp_path, monkeypatch):
+        rm = _make_repo_manager(tmp_path)
+        rm.config.clone_jobs = 3
+
+        def prepare_state(url, ref):
+            rm._session(rm._repo_path(url))
+            return url, {}
+
+        monkeypatch.setattr(rm, "_prepare_repository_state", prepare_state)
+        rm.prepare_repositories(
+            {f"https://example.com/r{i}.git": "main" for i in range(5)}
+        )
+        assert rm._sessions == {}
+
+
+class TestGitClone:
+    def _clone_command(self, rm, tmp_path):
+        rm.git_clone("https://example.com/repo.git", tmp_path / "repos" / "repo")
+        return rm.env_manager.wrangler_run.call_args[0][0]
+
+    def test_clone_is_blobless_by_default(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        command = self._clone_command(rm, tmp_path)
+        assert command[:2] == ("git", "clone")
+        assert "--filter=blob:none" in command
+        assert command[-2:] == (
+            "https://example.com/repo.git",
+            str(tmp_path / "repos" / "repo"),
+        )
+
+    def test_full_history_disables_filter(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.config.full_history = True
+        assert "--filter=blob:none" not in self._clone_command(rm, tmp_path)
+
+    def test_clone_disables_auto_gc_and_fsmonitor(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        command = self._clone_command(rm, tmp_path)
+        assert command[2:6] == ("-c", "gc.auto=0", "-c", "core.fsmonitor=false")
+
+
+class TestGitMirrors:
+    def test_mirror_path_https_and_scp_urls(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        mirrors = tmp_path / "mirrors"
+        assert (
+            rm._mirror_path("https://github.com/org/repo.git")
+            == mirrors / "github.com" / "org" / "repo.git"
+        )
+        assert (
+            rm._mirror_path("git@github.com:org/repo")
+            == mirrors / "github.com" / "org" / "repo.git"
+        )
+
+    def test_mirror_disabled_for_local_paths(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        assert rm._mirror_path(str(tmp_path)) is None
+        assert rm._mirror_path("file:///srv/git/repo.git") is None
+        rm.mirrors_dir = None
+        assert rm._mirror_path("https://github.com/org/repo.git") is None
+
+    def test_existing_mirror_is_updated_once_and_referenced(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        url = "https://example.com/org/mirrored.git"
+        mirror = rm._mirror_path(url)
+        mirror.mkdir(parents=True)
+        rm.git_clone(url, tmp_path / "repos" / "mirrored")
+        rm.git_clone(url, tmp_path / "repos" / "mirrored2")
+        commands = [c[0][0] for c in rm.env_manager.wrangler_run.call_args_list]
+        assert sum("update" in c for c in commands) == 1
+        start = commands[-1].index("--reference-if-able")
+        assert commands[-1][start : start + 3] == (
+            "--reference-if-able",
+            str(mirror),
+            "--dissociate",
+        )
+
+    def test_partial_clone_and_new_mirror_are_both_blobless(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        url = "https://example.com/org/blobless.git"
+        mirror = rm._mirror_path(url)
+
+        def wrangler_run(command, **keys):
+            if "--mirror" in command:
+                mirror.mkdir(parents=True)
+            return MagicMock(returncode=0)
+
+        rm.env_manager.wrangler_run.side_effect = wrangler_run
+        rm.git_clone(url, tmp_path / "repos" / "blobless")
+        create, clone = [c[0][0] for c in rm.env_manager.wrangler_run.call_args_list]
+        assert create == (
+            "git",
+            "clone",
+            "--mirror",
+            "--filter=blob:none",
+            "--",
+            url,
+            str(mirror),
+        )
+        assert clone[:2] == ("git", "clone")
+        assert "--filter=blob:none" in clone
+        start = clone.index("--reference-if-able")
+        assert clone[start : start + 3] == (
+            "--reference-if-able",
+            str(mirror),
+            "--dissociate",
+        )
+        assert clone[-2:] == (url, str(tmp_path / "repos" / "blobless"))
+
+    def test_full_history_mirror_is_unfiltered(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.config.full_history = True
+        url = "https://example.com/org/full.git"
+        rm._refresh_mirror(url, rm._mirror_path(url))
+        command = rm.env_manager.wrangler_run.call_args[0][0]
+        assert "--mirror" in command
+        assert "--filter=blob:none" not in command
+
+
+STATUS = ("git", "status", "--porcelain=v2", "--branch")
+
+
+class TestGitStateCaching:
+    def _fake_run(self, rm, outputs):
+        calls = []
+
+        def wrangler_run(command, **keys):
+            calls.append(command)
+            result = MagicMock(returncode=0, stdout=outputs.get(command, ""))
+            return result.stdout if keys.get("check") else result
+
+        rm.env_manager.wrangler_run.side_effect = wrangler_run
+        return calls
+
+    def test_get_hash_and_is_clean_are_cached(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        calls = self._fake_run(rm, {STATUS: "# branch.oid abc123\n"})
+        repo = tmp_path / "repos" / "cached"
+        assert rm.get_hash(repo) == "abc123"
+        assert rm.get_hash(repo) == "abc123"
+        assert rm.is_clean(repo)
+        assert calls == [STATUS]
+
+    def test_mutating_command_invalidates_cache(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        calls = self._fake_run(rm, {STATUS: "# branch.oid abc123\n"})
+        rm.repos_dir.mkdir(parents=True)
+        rm.get_hash(rm.repos_dir / "cached")
+        rm.git_checkout("cached", "main")
+        rm.get_hash(rm.repos_dir / "cached")
+        assert calls.count(STATUS) == 2
+
+    def test_inspect_repo_parses_status(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        self._fake_run(
+            rm, {STATUS: "# branch.oid (initial)\n# branch.head main\n? new.txt\n"}
+        )
+        assert rm.inspect_repo(tmp_path) == (False, None)
+
+
+def _init_git_repo(path):
+    env = dict(
+        os.environ,
+        GIT_AUTHOR_NAME="t",
+        GIT_AUTHOR_EMAIL="t@example.com",
+        GIT_COMMITTER_NAME="t",
+        GIT_COMMITTER_EMAIL="t@example.com",
+    )
+    path.mkdir(parents=True)
+    for command in (
+        ["git", "init", "-q"],
+        ["git", "commit", "-q", "--allow-empty", "-m", "initial"],
+        ["git", "tag", "-a", "-m", "annotated", "2026.2.1"],
+    ):
+        subprocess.run(command, cwd=path, env=env, check=True)
+    return subprocess.run(
+        ["git", "rev-parse", "HEAD"], cwd=path, capture_output=True, text=True
+    ).stdout.strip()
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+class TestGitSession:
+    def test_resolves_head_and_peels_annotated_tags(self, tmp_path):
+        head = _init_git_repo(tmp_path / "repo")
+        session = _GitSession(tmp_path / "repo")
+        try:
+            assert session.resolve("HEAD") == head
+            assert session.resolve("2026.2.1") == head
+            assert session.type_of(head) == "commit"
+            assert session.resolve("no-such-ref") is None
+        finally:
+            session.close()
+
+    def test_non_repository_returns_none(self, tmp_path):
+        session = _GitSession(tmp_path)
+        assert session.resolve("HEAD") is None
+        session.close()
+
+
+class TestMessagesViaStdin:
+    def test_commit_message_is_passed_on_stdin(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.git_commit("repo", "Subject\n\nBody with 'quotes'.")
+        args, keys = rm.env_manager.wrangler_run.call_args
+        assert args[0] == ("git", "commit", "-F", "-")
+        assert keys["input"] == "Subject\n\nBody with 'quotes'."
+
+    def test_pr_body_is_passed_on_stdin(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.github_create_pr("repo", "main", "A title", "PR body")
+        args, keys = rm.env_manager.wrangler_run.call_args
+        assert args[0][-2:] == ("--body-file", "-")
+        assert "A title" in args[0]
+        assert keys["input"] == "PR body"
+
+
+class TestFloatingUpdate:
+    def _update(self, tmp_path, ref, fetch_returncode=0):
+        rm = _make_repo_manager(tmp_path)
+        rm.env_manager.wrangler_run.return_value = MagicMock(
+            returncode=fetch_returncode, stdout="", stderr=""
+        )
+        repo_path = rm.repos_dir / "repo"
+        repo_path.mkdir(parents=True)
+        result = rm._update_floating(repo_path, "https://example.com/repo.git", ref)
+        commands = [c[0][0] for c in rm.env_manager.wrangler_run.call_args_list]
+        return result, commands
+
+    def test_default_branch_is_fetch_and_checkout(self, tmp_path):
+        result, commands = self._update(tmp_path, None)
+        assert result == tmp_path / "repos" / "repo"
+        assert commands == [
+            ("git", "fetch", "--tags", "origin", "HEAD", GIT_ORIGIN_BRANCHES_REFSPEC),
+            ("git", "checkout", "FETCH_HEAD"),
+        ]
+
+    def test_unfetchable_ref_falls_back_to_resolution(self, tmp_path, monkeypatch):
+        resolved = []
+        monkeypatch.setattr(
+            RepositoryManager,
+            "_resolve_ref_with_fallback",
+            lambda self, name, ref_to_checkout, ref: resolved.append(ref) or True,
+        )
+        result, commands = self._update(tmp_path, "2026.2", fetch_returncode=128)
+        assert result is not None
+        assert resolved == ["2026.2"]
+        assert ("git", "checkout", "FETCH_HEAD") not in commands
+
+
+GIT_TEST_ENV = dict(
+    os.environ,
+    GIT_AUTHOR_NAME="t",
+    GIT_AUTHOR_EMAIL="t@example.com",
+    GIT_COMMITTER_NAME="t",
+    GIT_COMMITTER_EMAIL="t@example.com",
+)
+
+
+def _git(cwd, *args):
+    return subprocess.run(
+        ("git", *args),
+        cwd=cwd,
+        env=GIT_TEST_ENV,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+class TestFloatingUpdateWithGit:
+    def _setup(self, tmp_path):
+        upstream = tmp_path / "upstream"
+        upstream.mkdir()
+        _git(upstream, "init", "-q", "-b", "main")
+        _git(upstream, "commit", "-q", "--allow-empty", "-m", "first")
+        rm = _make_repo_manager(tmp_path)
+        clone = rm.repos_dir / "repo"
+        _git(tmp_path, "clone", "-q", str(upstream), str(clone))
+        _git(upstream, "commit", "-q", "--allow-empty", "-m", "second")
+
+        def wrangler_run(command, check=True, cwd=None, **keys):
+            result = subprocess.run(
+                command,
+                cwd=cwd,
+                env=GIT_TEST_ENV,
+                capture_output=True,
+                text=True,
+                check=check,
+            )
+            return result.stdout if check else result
+
+        rm.env_manager.wrangler_run.side_effect = wrangler_run
+        return rm, clone, _git(upstream, "rev-parse", "HEAD")
+
+    @pytest.mark.parametrize("ref", [None, "main"])
+    def test_tracking_and_local_branches_follow_origin(self, tmp_path, ref):
+        rm, clone, latest = self._setup(tmp_path)
+        assert rm._update_floating(clone, "upstream", ref) == clone
+        assert _git(clone, "rev-parse", "HEAD", "origin/main").split() == [
+            latest,
+            latest,
+        ]
+        if ref:
+            assert _git(clone, "rev-parse", "main") == latest
+            assert rm.resolve_ref_to_sha("repo", "main") == latest
+
+
+class TestSubmodules:
+    def test_submodules_are_cloned_in_parallel_when_enabled(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.config.clone_submodules = True
+        rm.git_clone("https://example.com/repo.git", tmp_path / "repos" / "repo")
+        command = rm.env_manager.wrangler_run.call_args[0][0]
+        assert "--recurse-submodules" in command
+        assert "--jobs" in command
+
+    def test_checkout_updates_submodules_only_when_enabled(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.env_manager.wrangler_run.return_value = MagicMock(returncode=0)
+        rm.git_checkout("repo", "main")
+        assert rm.env_manager.wrangler_run.call_count == 1
+        rm.config.clone_submodules = True
+        rm.git_checkout("repo", "main")
+        command = rm.env_manager.wrangler_run.call_args[0][0]
+        assert command[:5] == ("git", "submodule", "update", "--init", "--recursive")
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+class TestPinnedCommits:
+    def test_local_commit_resolves_without_fetch(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        head = _init_git_repo(rm.repos_dir / "repo")
+        assert rm.resolve_ref_to_sha("repo", head.upper()) == head
+        rm.env_manager.wrangler_run.assert_not_called()
+        rm.close_sessions()
+
+    def test_prepare_pinned_repo_skips_resolution(self, tmp_path, monkeypatch):
+        rm = _make_repo_manager(tmp_path)
+        head = "a" * 40
+        (rm.repos_dir / "repo" / ".git").mkdir(parents=True)
+        monkeypatch.setattr(rm, "inspect_repo", lambda path: (True, head))
+        monkeypatch.setattr(
+            rm, "resolve_ref_to_sha", MagicMock(side_effect=AssertionError)
+        )
+        assert rm.prepare_repository("https://example.com/repo.git", head)
+
+
+class TestDeleteRepos:
+    def test_deletes_read_only_trees_and_empty_repos_dir(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.config.clone_jobs = 2
+        urls = [f"https://example.com/r{i}.git" for i in range(3)]
+        for url in urls[:2]:
+            objects = rm._repo_path(url) / ".git" / "objects" / "ab"
+            objects.mkdir(parents=True)
+            (objects / "cdef").write_text("blob")
+            (objects / "cdef").chmod(0o444)
+            objects.chmod(0o555)
+        assert rm.delete_repos(urls)
+        assert not rm.repos_dir.exists()
+
+    def test_retry_never_chmods_through_symlinks(self, tmp_path, monkeypatch):
+        outside = tmp_path / "outside.txt"
+        outside.write_text("keep")
+        outside.chmod(0o644)
+        tree = tmp_path / "repos" / "linked"
+        tree.mkdir(parents=True)
+        (tree / "link").symlink_to(outside)
+        real_unlink, refused = os.unlink, []
+
+        def unlink(path, *args, **keys):
+            if os.path.basename(path) == "link" and not refused:
+                refused.append(path)
+                raise PermissionError(path)
+            return real_unlink(path, *args, **keys)
+
+        monkeypatch.setattr(os, "unlink", unlink)
+        RepositoryManager._remove_tree(tree)
+        assert refused
+        assert not tree.exists()
+        assert outside.stat().st_mode & 0o777 == 0o644
+
+    def test_keeps_repos_dir_with_other_contents(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.repos_dir.mkdir(parents=True)
+        (rm.repos_dir / ".keep").touch()
+        assert rm.delete_repos(["https://example.com/missing.git"])
+        assert (rm.repos_dir / ".keep").exists()
+
+
+class TestRepoPath:
+    def test_repo_path_is_stable_and_follows_repos_dir(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        url = "https://github.com/org/notebooks.git@v1"
+        assert rm._repo_path(url) == tmp_path / "repos" / "notebooks"
+        rm.repos_dir = tmp_path / "other"
+        assert rm.get_repo_path(url) == tmp_path / "other" / "notebooks"
+
+    def test_is_commit_hash(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        assert rm._is_commit_hash("0123456789abcdefABCDEF0123456789abcdef01")
+        assert not rm._is_commit_hash("0123456789abcdef")
+        assert not rm._is_commit_hash("g" * 40)
+        assert not rm._is_commit_hash("é" * 40)
+
+
+class TestTagFetches:
+    def test_tags_fetched_once_across_resolutions(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.env_manager.wrangler_run.return_value = MagicMock(
+            returncode=0, stdout="v1.0\nv1.1\n"
+        )
+        (rm.repos_dir / "repo").mkdir(parents=True)
+        rm._rev_parse = lambda root, ref: "f" * 40
+        rm.resolve_ref_to_sha("repo", "v1")
+        rm.resolve_ref_to_entry("repo", "v1")
+        rm.fetch_sorted_tags(rm.repos_dir / "repo")
+        commands = [c[0][0] for c in rm.env_manager.wrangler_run.call_args_list]
+        assert commands.count(("git", "fetch", "--tags")) == 1
+
+    def test_fresh_clone_needs_no_tag_fetch(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        repo_dir = tmp_path / "repos" / "repo"
+        rm.git_clone("https://example.com/repo.git", repo_dir)
+        rm.git_fetch_tags(repo_dir)
+        commands = [c[0][0] for c in rm.env_manager.wrangler_run.call_args_list]
+        assert ("git", "fetch", "--tags") not in commands
+
+    def test_floating_fetch_records_tags(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        rm.env_manager.wrangler_run.return_value = MagicMock(returncode=0)
+        repo_dir = tmp_path / "repos" / "repo"
+        assert rm.git_fetch_ref(repo_dir, "main")
+        rm.git_fetch_tags(repo_dir)
+        commands = [c[0][0] for c in rm.env_manager.wrangler_run.call_args_list]
+        assert commands == [
+            ("git", "fetch", "--tags", "origin", "main", GIT_ORIGIN_BRANCHES_REFSPEC)
+        ]
+
+
+class TestBranchRepo:
+    def test_checks_out_ingest_branch_then_creates_branch(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        calls = []
+
+        def wrangler_run(command, **keys):
+            calls.append(command)
+            if keys.get("check"):
+                return "# branch.oid abc123\n"
+            return MagicMock(returncode=0, stdout="", stderr="")
+
+        rm.env_manager.wrangler_run.side_effect = wrangler_run
+        (rm.repos_dir / "repo").mkdir(parents=True)
+        assert rm.branch_repo("repo", "nbw-update")
+        assert calls == [
+            STATUS,
+            ("git", "checkout", "origin/main"),
+            ("git", "checkout", "-b", "nbw-update"),
+        ]
+
+    def test_refuses_missing_repo(self, tmp_path):
+        rm = _make_repo_manager(tmp_path)
+        assert not rm.branch_repo("missing", "nbw-update")
+        rm.env_manager.wrangler_run.assert_not_called()
+
+
+class TestDirtyPrompt:
+    def test_reprompts_until_valid_choice(self, tmp_path, monkeypatch):
+        rm = _make_repo_manager(tmp_path)
+        answers = iter(["x", " d "])
+        prompts = []
+        monkeypatch.setattr("sys.stdin.isatty", lambda: True)
+        monkeypatch.setattr(
+            "builtins.input", lambda prompt: prompts.append(prompt) or next(answers)
+        )
+        monkeypatch.setattr(rm, "git_reset_hard", lambda name: name == "repo")
+        assert rm._prompt_dirty_repository("repo")
+        assert len(prompts) == 2 and prompts[0] == prompts[1]
+
+    def test_non_interactive_stashes(self, tmp_path, monkeypatch):
+        rm = _make_repo_manager(tmp_path)
+        monkeypatch.setattr("sys.stdin.isatty", lambda: False)
+        monkeypatch.setattr(rm, "git_stash", lambda name: True)
+        assert rm._prompt_dirty_repository("repo")
@@ -1,5 +1,7 @@
 """Extended tests for nb_wrangler/spec_manager.py on load, assets, and normalization."""
 
+from unittest.mock import MagicMock, patch
+
 import yaml
 
 from nb_wrangler.config import WranglerConfig, set_args_config
@@ -103,6 +105,100 @@ class TestSpecManagerLoadRoundTrip:
         out_file = output_dir / "src.yaml"
         assert out_file.exists()
 
+    def test_save_spec_with_sha256_matches_reserialized(self, tmp_path):
+        from nb_wrangler.spec_manager import SpecManager
+
+        set_args_config(WranglerConfig(workflows=[], repos_dir=tmp_path / "repos"))
+        sm = SpecManager()
+        spec_file = tmp_path / "src.yaml"
+        spec_file.write_text(yaml.dump(_make_valid_spec_dict()))
+        assert sm.load_spec(spec_file) is True
+
+        out_file = tmp_path / "out.yaml"
+        assert sm.save_spec_as(out_file, add_sha256=True) is True
+        assert out_file.read_text() == sm.to_string()
+
+        reloaded = SpecManager()
+        assert reloaded.load_spec(out_file) is True
+        assert reloaded.validate_sha256() is True
+
+    def test_save_spec_as_replaces_existing_file(self, tmp_path):
+        from nb_wrangler.spec_manager import SpecManager
+
+        set_args_config(WranglerConfig(workflows=[], repos_dir=tmp_path / "repos"))
+        sm = SpecManager()
+        spec_file = tmp_path / "src.yaml"
+        spec_file.write_text(yaml.dump(_make_valid_spec_dict()))
+        assert sm.load_spec(spec_file) is True
+
+        out_file = tmp_path / "out.yaml"
+        out_file.write_text("stale")
+        assert sm.save_spec_as(out_file) is True
+        assert out_file.read_text() == sm.to_string()
+        assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
+
+    def test_save_spec_as_failure_leaves_existing_file(self, tmp_path):
+        from nb_wrangler.spec_manager import SpecManager
+
+        set_args_config(WranglerConfig(workflows=[], repos_dir=tmp_path / "repos"))
+        sm = SpecManager()
+        spec_file = tmp_path / "src.yaml"
+        spec_file.write_text(yaml.dump(_make_valid_spec_dict()))
+        assert sm.load_spec(spec_file) is True
+        sm.logger = MagicMock()
+        sm.logger.exception.return_value = False
+
+        out_file = tmp_path / "out.yaml"
+        out_file.write_text("original")
+        with patch("nb_wrangler.spec_manager.os.replace", side_effect=OSError("boom")):
+            assert sm.save_spec_as(out_file) is False
+        assert out_file.read_text() == "original"
+        assert not (tmp_path / "out.yaml.tmp").exists()
+
+    def test_sha256_property_warns_on_malformed_hash(self, tmp_path):
+        from nb_wrangler.spec_manager import SpecManager
+
+        set_args_config(WranglerConfig(workflows=[], repos_dir=tmp_path / "repos"))
+        sm = SpecManager()
+        spec_file = tmp_path / "src.yaml"
+        spec_file.write_text(yaml.dump(_make_valid_spec_dict()))
+        assert sm.load_spec(spec_file) is True
+        sm.logger = MagicMock()
+
+        good = sm.add_sha256()
+        assert sm.sha256 == good
+        sm.logger.warning.assert_not_called()
+
+        for bad in ("G" * 64, good[:-1], good + "0"):
+            sm.system["spec_sha256"] = bad
+            assert sm.sha256 == bad
+        assert sm.logger.warning.call_count == 3
+
+    def test_outputs_exist(self, tmp_path):
+        from nb_wrangler.spec_manager import SpecManager
+
+        set_args_config(WranglerConfig(workflows=[], repos_dir=tmp_path / "repos"))
+        sm = SpecManager()
+        sm._spec = {}
+        assert sm.outputs_exist("data") is False
+        sm._spec = {"out": None}
+        assert sm.outputs_exist("data") is False
+        sm._spec = {"out": {"data": 1, "mamba_spec": 2}}
+        assert sm.outputs_exist("data", "mamba_spec") is True
+        assert sm.outputs_exist("data", "pip_map") is False
+        assert sm.outputs_exist() is True
+
+    def test_files_exist(self, tmp_path):
+        from nb_wrangler.spec_manager import SpecManager
+
+        set_args_config(WranglerConfig(workflows=[], repos_dir=tmp_path / "repos"))
+        sm = SpecManager()
+        present = tmp_path / "present.txt"
+        present.write_text("x")
+        assert sm.files_exist(present, str(present)) is True
+        assert sm.files_exist(present, tmp_path / "missing.txt") is False
+        assert sm.files_exist() is True
+
 
 class TestInlineMambaSpecDetection:
     def test_second_document_sets_inline_mamba_spec(self, tmp_path):
@@ -404,3 +500,118 @@ class TestTestEnvVarsField:
         assert sm.validate() is True
         env_vars = sm.test_env_vars
         assert env_vars["FOO"] == "base_value"
+
+
+class TestNotebookSelectionFilters:
+    def test_include_exclude_and_checkpoints(self, tmp_path):
+        from nb_wrangler.spec_manager import SpecManager
+
+        set_args_config(WranglerConfig(workflows=[], repos_dir=tmp_path / "repos"))
+        sm = SpecManager()
+        repo = tmp_path / "repo"
+        for rel in (
+            "nbs/a/one.ipynb",
+            "nbs/b/two.ipynb",
+            "nbs/a/skip/three.ipynb",
+            "nbs/a/.ipynb_checkpoints/one-checkpoint.ipynb",
+        ):
+            (repo / rel).parent.mkdir(parents=True, exist_ok=True)
+            (repo / rel).write_text("{}")
+        (repo / "nbs/a/dir.ipynb").mkdir()
+
+        found = sm._process_directory_entry(
+            {"include_subdirs": [r"/a/", r"two\.ipynb$"], "exclude_subdirs": ["skip"]},
+            repo,
+            "nbs",
+        )
+        assert found == {
+            str(repo / "nbs/a/one.ipynb"),
+            str(repo / "nbs/b/two.ipynb"),
+        }
+
+    def test_regexes_joined_only_when_equivalent(self):
+        from nb_wrangler.spec_manager import _compile_alternatives
+
+        (joined,) = _compile_alternatives((r"/a/", r"two\.ipynb$"))
+        assert _compile_alternatives((r"/a/", r"two\.ipynb$")) == (joined,)
+        assert joined.search("x/a/y.ipynb") and joined.search("b/two.ipynb")
+        assert not joined.search("b/three.ipynb")
+
+        for regexes in ((r"(a)\1", "b"), ("(?i)A", "b")):
+            patterns = _compile_alternatives(regexes)
+            assert tuple(p.pattern for p in patterns) == regexes
+
+    def test_find_notebook_files_matches_glob(self, tmp_path):
+        from nb_wrangler.spec_manager import SpecManager
+
+        set_args_config(WranglerConfig(workflows=[], repos_dir=tmp_path / "repos"))
+        sm = SpecManager()
+        repo = tmp_path / "repo"
+        (repo / "a/b").mkdir(parents=True)
+        (repo / "a/b/deep.ipynb").write_text("{}")
+        (repo / "top.ipynb").write_text("{}")
+        (repo / "notes.txt").write_text("")
+        (repo / ".hidden.ipynb").write_text("{}")
+        (repo / "dir.ipynb").mkdir()
+        (repo / "link.ipynb").symlink_to(repo / "top.ipynb")
+        (repo / "dangling.ipynb").symlink_to(repo / "missing")
+        (repo / "linked_dir").symlink_to(repo / "a")
+
+        (repo / ".git").mkdir()
+        (repo / ".git/stray.ipynb").write_text("{}")
+        (repo / "a/.ipynb_checkpoints").mkdir()
+        (repo / "a/.ipynb_checkpoints/x-checkpoint.ipynb").write_text("{}")
+
+        expected = {
+            str(p)
+            for p in repo.glob("**/*.ipynb")
+            if p.is_file() and not {".git", ".ipynb_checkpoints"} & set(p.parts)
+        }
+        assert sorted(sm._find_notebook_files(str(repo))) == sorted(expected)
+        assert sm._find_notebook_files(str(repo / "missing")) == []
+
+
+class TestCollectNotebookPaths:
+    def test_shared_repo_located_once(self, tmp_path):
+        from nb_wrangler.spec_manager import SpecManager
+
+        set_args_config(WranglerConfig(workflows=[], repos_dir=tmp_path / "repos"))
+        sm = SpecManager()
+        sm._is_validated = True
+        sm._spec = {
+            "repositories": {"r": {"url": "https://github.com/org/proj.git"}},
+            "selected_notebooks": {
+                "first": {"repo": "r", "include_subdirs": ["one"]},
+                "second": {"repo": "r", "include_subdirs": ["two"]},
+            },
+        }
+        repo = tmp_path / "repos" / "proj"
+        repo.mkdir(parents=True)
+        (repo / "one.ipynb").write_text("{}")
+        (repo / "two.ipynb").write_text("{}")
+
+        with patch.object(sm, "_get_repo_dir", wraps=sm._get_repo_dir) as get_dir:
+            paths = sm.collect_notebook_paths(tmp_path / "repos")
+        assert get_dir.call_count == 1
+        assert paths == {
+            str(repo / "one.ipynb"): "first",
+            str(repo / "two.ipynb"): "second",
+        }
+
+    def test_duplicate_notebooks_keep_first_selection(self, tmp_path):
+        from nb_wrangler.spec_manager import SpecManager
+
+        set_args_config(WranglerConfig(workflows=[], repos_dir=tmp_path / "repos"))
+        sm = SpecManager()
+        sm._is_validated = True
+        names = [f"sel{i}" for i in range(12)]
+        sm._spec = {
+            "repositories": {"r": {"url": "https://github.com/org/proj"}},
+            "selected_notebooks": {name: {"repo": "r"} for name in names},
+        }
+        repo = tmp_path / "repos" / "proj"
+        repo.mkdir(parents=True)
+        (repo / "nb.ipynb").write_text("{}")
+
+        paths = sm.collect_notebook_paths(tmp_path / "repos")
+        assert paths == {str(repo / "nb.ipynb"): "sel0"}
@@ -13,12 +13,12 @@ def _make_result(returncode=0, stdout=""):
 
 def fake_git_output(cmd):
     """Return fake git command output based on the command string."""
+    if isinstance(cmd, (list, tuple)):
+        cmd = " ".join(cmd)
     if cmd == "git tag -l":
         return "main\nv1.2.3\n2026.2.0\n2026.2.1\n2026.2.2"
     if isinstance(cmd, str) and cmd.startswith("git rev-parse ") and "2026.2.2" in cmd:
         return "aabbccdd11223344556677889900aabbccddeeff"
-    if cmd == "git symbolic-ref refs/remotes/origin/HEAD":
-        return "refs/remotes/origin/main"
     if cmd in ("git fetch", "git fetch --tags"):
         return ""
     if isinstance(cmd, str) and cmd.startswith("git checkout"):
@@ -51,16 +51,24 @@ class MockConfig:
     use_dirty_repos = False
 
 
+def fake_git_returncode(cmd):
+    """Origin only advertises full ref names, not tag prefixes."""
+    if tuple(cmd[:4]) == ("git", "fetch", "--tags", "origin"):
+        return 0 if cmd[4] in ("HEAD", "main", "2026.2.2") else 128
+    return 0
+
+
 def _make_repo_manager(repos_dir):
     from nb_wrangler.repository import RepositoryManager
 
     rm = RepositoryManager(repos_dir=repos_dir)
     mock_env = MagicMock()
     mock_env.wrangler_run.side_effect = lambda *a, **k: _make_result(
-        stdout=fake_git_output(a[0])
+        returncode=fake_git_returncode(a[0]), stdout=fake_git_output(a[0])
     )
     mock_env.handle_result.side_effect = lambda result, *args: True
     rm.env_manager = mock_env
+    rm.mirrors_dir = None
     rm.logger = MockLogger()
     if not hasattr(rm, "_config") or rm._config is None:
         rm._config = MockConfig()
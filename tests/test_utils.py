@@ -5,12 +5,14 @@ from pathlib import Path
 from unittest.mock import MagicMock, patch  # noqa: F401,F811
 
 import pytest
+import requests
 from ruamel.yaml import YAML
 
 from nb_wrangler.utils import (  # noqa: F401
     get_yaml,
     yaml_dumps,
     yaml_block,
+    fast_clone,
     remove_common_prefix,
     create_divider,
     elapsed_time,
@@ -22,6 +24,7 @@ from nb_wrangler.utils import (  # noqa: F401
     uri_to_local_path,
     HeadInfo,
     get_head_info,
+    get_http_session,
     once,
     files_to_map,
     writelines,
@@ -47,6 +50,16 @@ class TestGetYaml:
         yaml = get_yaml()
         assert yaml.preserve_quotes is True
 
+    def test_cached_per_thread(self):
+        import threading
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_yaml()))
+        thread.start()
+        thread.join()
+        assert get_yaml() is get_yaml()
+        assert other[0] is not get_yaml()
+
     def test_indent_defaults(self):
         yaml_str = yaml_dumps({"a": 1})
         assert yaml_str is not None and "a" in yaml_str
@@ -82,6 +95,22 @@ class TestYamlBlock:
         assert "|" in dumped
 
 
+class TestFastClone:
+    def test_clone_is_independent(self):
+        original = {"a": [1, {"b": "c"}], "d": None}
+        clone = fast_clone(original)
+        assert clone == original
+        clone["a"][1]["b"] = "changed"
+        clone["a"].append(2)
+        assert original == {"a": [1, {"b": "c"}], "d": None}
+
+    def test_clones_loaded_yaml(self):
+        loaded = get_yaml().load("x:\n  y: [1, 2]\n  z: 'q'\n")
+        clone = fast_clone(loaded)
+        assert type(clone) is dict and type(clone["x"]["y"]) is list
+        assert clone == {"x": {"y": [1, 2], "z": "q"}}
+
+
 class TestRemoveCommonPrefix:
     def test_empty_list(self):
         assert remove_common_prefix([]) == []
@@ -102,6 +131,10 @@ class TestRemoveCommonPrefix:
         result = remove_common_prefix(["hello", "hello"])
         assert result == ["", ""]
 
+    def test_prefix_is_character_wise(self):
+        result = remove_common_prefix(["repo/nb1.ipynb", "repo/nb2.ipynb"])
+        assert result == ["1.ipynb", "2.ipynb"]
+
 
 class TestCreateDivider:
     def test_centered_title(self):
@@ -212,6 +245,41 @@ class TestUriToLocalPath:
         result = uri_to_local_path(f"file://{fpath}")
         assert result == str(fpath.resolve())
 
+    def test_http_download_streams_bytes_to_basename(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.iter_content.return_value = [b"name: x\n", b"caf\xc3\xa9\n"]
+        with patch.object(get_http_session(), "get", return_value=response) as get:
+            result = uri_to_local_path("https://example.com/specs/spec.yaml")
+        assert get.call_args.kwargs["stream"] is True
+        assert result == "spec.yaml"
+        assert (tmp_path / "spec.yaml").read_bytes() == b"name: x\ncaf\xc3\xa9\n"
+
+    def test_http_download_names_file_from_uri_path(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.iter_content.return_value = [b"name: x\n"]
+        with patch.object(get_http_session(), "get", return_value=response):
+            result = uri_to_local_path("https://example.com/spec.yaml?raw=true#top")
+        assert result == "spec.yaml"
+
+    def test_failed_http_download_leaves_no_file(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        response = MagicMock()
+        response.__enter__.return_value = response
+
+        def chunks(chunk_size):
+            yield b"name: x\n"
+            raise requests.exceptions.ConnectionError("reset")
+
+        response.iter_content.side_effect = chunks
+        with patch.object(get_http_session(), "get", return_value=response):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                uri_to_local_path("https://example.com/spec.yaml")
+        assert list(tmp_path.iterdir()) == []
+
     def test_unsupported_scheme_raises_value_error(self):
         with pytest.raises(ValueError, match="Unsupported URI scheme"):
             uri_to_local_path("ftp://example.com/file.txt")
@@ -228,6 +296,27 @@ class TestHeadInfo:
         assert d["etag"] == "abc"
 
 
+class TestHttpSession:
+    def test_session_is_shared(self):
+        session = get_http_session()
+        assert session is get_http_session()
+        assert session.get_adapter("https://example.com").max_retries.total == 3
+
+    def test_get_head_info_uses_shared_session(self):
+        response = MagicMock()
+        response.headers = {
+            "content-length": "12",
+            "etag": "abc",
+            "last-modified": "Mon, 01 Jan 2026 00:00:00 GMT",
+        }
+        with patch.object(get_http_session(), "head", return_value=response) as head:
+            info = get_head_info("https://example.com/data.tar", timeout=5)
+        head.assert_called_once_with(
+            "https://example.com/data.tar", timeout=5, allow_redirects=True
+        )
+        assert info == HeadInfo(12, "abc", "Mon, 01 Jan 2026 00:00:00 GMT")
+
+
 class TestOnceDecorator:
     def test_runs_only_once(self):
         call_count = [0]
@@ -242,6 +331,29 @@ class TestOnceDecorator:
         assert first == 1
         assert call_count[0] == 1
 
+    def test_concurrent_first_calls_run_once(self):
+        import threading
+        import time
+
+        call_count = [0]
+
+        @once
+        def slow():
+            call_count[0] += 1
+            time.sleep(0.05)
+            return call_count[0]
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(slow())) for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert call_count[0] == 1
+        assert results == [1] * 8
+
 
 class TestFilesToMap:
     def test_creates_mapping_from_files(self, tmp_path):
@@ -290,11 +402,22 @@ class TestSha256Roundtrip:
         fpath.write_bytes(content)
         assert sha256_file(fpath) == sha256_bytes(content)
 
+    def test_verify_file_match(self, tmp_path):
+        fpath = tmp_path / "data.bin"
+        fpath.write_bytes(b"data")
+        assert sha256_verify_file(str(fpath), sha256_bytes(b"data")) is True
+
     def test_verify_file_mismatch(self, tmp_path):
         fpath = tmp_path / "data.bin"
         fpath.write_bytes(b"data")
         assert sha256_verify_file(str(fpath), sha256_bytes(b"different")) is False
 
+    def test_verify_file_missing_or_non_ascii_hash(self, tmp_path):
+        fpath = tmp_path / "data.bin"
+        fpath.write_bytes(b"data")
+        assert sha256_verify_file(str(fpath), None) is False
+        assert sha256_verify_file(str(fpath), "é" * 64) is False
+
 
 class TestClearDirectory:
     def test_removes_contents_keeps_dir(self, tmp_path):
@@ -359,6 +482,10 @@ class TestResolveVars:
         result = resolve_vars("${X:-fallback}", {"X": "actual"})
         assert result == "actual"
 
+    def test_literal_returned_unchanged(self):
+        template = "main/no-vars_here"
+        assert resolve_vars(template, {"main": "x"}) is template
+
 
 class TestResolveEnv:
     def test_resolves_in_dict_values(self):